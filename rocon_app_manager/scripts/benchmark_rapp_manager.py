@@ -0,0 +1,355 @@
+#!/usr/bin/env python
+#
+# License: BSD
+#   https://raw.github.com/robotics-in-concert/rocon_app_platform/master/rocon_app_manager/LICENSE
+#
+##############################################################################
+# Overview
+##############################################################################
+'''
+ Benchmarks the rapp manager against a generated catalog of rapps, with an
+ in-process master and a stand-in gateway (with configurable latency), so
+ no roscore or gateway needs to be running. Reports startup time (with a
+ cold and a warm rapp index), list_apps throughput, start/stop/invite
+ latency percentiles and memory use. Use --json to save the results for
+ comparison between runs.
+
+ Example:
+
+   rosrun rocon_app_manager benchmark_rapp_manager.py --rapps 1000 --json results.json
+'''
+##############################################################################
+# Imports
+##############################################################################
+
+import os
+import sys
+import time
+import json
+import shutil
+import argparse
+import resource
+import tempfile
+import uuid
+import rosmaster.master
+import rospy
+import rocon_app_manager
+import rocon_app_manager_msgs.srv as rapp_manager_srvs
+import gateway_msgs.msg as gateway_msgs
+import gateway_msgs.srv as gateway_srvs
+
+##############################################################################
+# Synthetic Rapps
+##############################################################################
+
+package_name = 'rocon_benchmark_rapps'
+
+
+def generate_rapps(directory, count, icon_size, node=None):
+    '''
+      Generate a package of rapps along with a rapp list of them all.
+
+      @param directory : where to create the package
+      @type str
+      @param count : number of rapps to generate
+      @type int
+      @param icon_size : size (bytes) of each rapp's icon, zero for no icons
+      @type int
+      @param node : pkg/type of a node for each rapp to run, None to launch no nodes (manager overhead only)
+      @type str
+      @return rapp names
+      @rtype [str]
+    '''
+    package_dir = os.path.join(directory, package_name)
+    os.makedirs(package_dir)
+    with open(os.path.join(package_dir, 'package.xml'), 'w') as f:
+        f.write('<package>\n  <name>%s</name>\n  <version>0.0.0</version>\n  <description>Benchmark rapps</description>\n'
+                '  <maintainer email="nobody@example.com">nobody</maintainer>\n  <license>BSD</license>\n</package>\n' % package_name)
+    names = []
+    for i in range(count):
+        name = 'rapp_%05d' % i
+        rapp_dir = os.path.join(package_dir, 'apps', name)
+        os.makedirs(rapp_dir)
+        with open(os.path.join(rapp_dir, name + '.rapp'), 'w') as f:
+            f.write('display: Benchmark Rapp %s\n' % i)
+            f.write('description: Generated for benchmarking the rapp manager\n')
+            f.write('platform: linux.*.ros.*\n')
+            f.write('launch: %s/%s.launch\n' % (package_name, name))
+            f.write('interface: %s/%s.interface\n' % (package_name, name))
+            if icon_size:
+                f.write('icon: %s/%s.png\n' % (package_name, name))
+            f.write('pairing_clients:\n - type: android\n   manager:\n     api-level: 10\n     intent-action: com.example.%s\n' % name)
+        with open(os.path.join(rapp_dir, name + '.interface'), 'w') as f:
+            f.write('publishers: [%s]\nsubscribers: []\nservices: []\n' % ('chatter' if node else ''))
+        with open(os.path.join(rapp_dir, name + '.launch'), 'w') as f:
+            f.write('<launch>\n  <arg name="gateway_name"/>\n  <param name="index" value="%s"/>\n' % i)
+            if node:
+                pkg, typ = node.split('/')
+                f.write('  <node name="%s" pkg="%s" type="%s"/>\n' % (name, pkg, typ))
+            f.write('</launch>\n')
+        if icon_size:
+            with open(os.path.join(rapp_dir, name + '.png'), 'wb') as f:
+                f.write(os.urandom(icon_size))
+        names.append(package_name + '/' + name)
+    with open(os.path.join(package_dir, 'benchmark.rapps'), 'w') as f:
+        f.write('apps:\n')
+        for name in names:
+            f.write(' - name: %s\n' % name)
+    return names
+
+##############################################################################
+# Stand-in Gateway
+##############################################################################
+
+
+class FakeGateway(object):
+    '''
+      Stands in for the gateway's services, answering each call after the
+      configured latency.
+    '''
+    def __init__(self, name, ip, latency):
+        self.name = name
+        self.ip = ip
+        self.latency = latency
+        self.remote_gateways = [gateway_msgs.RemoteGateway(name='benchmark_remote', ip=ip)]
+        self.calls = {}
+
+    def _call(self, service):
+        self.calls[service] = self.calls.get(service, 0) + 1
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+    def gateway_info(self):
+        self._call('gateway_info')
+        return gateway_msgs.GatewayInfo(name=self.name, ip=self.ip, connected=True)
+
+    def remote_gateway_info(self, req):
+        self._call('remote_gateway_info')
+        return gateway_srvs.RemoteGatewayInfoResponse(gateways=self.remote_gateways)
+
+    def flip(self, req):
+        self._call('flip')
+        return gateway_srvs.RemoteResponse(result=0, error_message='')
+
+    def pull(self, req):
+        self._call('pull')
+        return gateway_srvs.RemoteResponse(result=0, error_message='')
+
+    def advertise(self, req):
+        self._call('advertise')
+        return gateway_srvs.AdvertiseResponse(result=0, error_message='')
+
+    def force_update(self, msg):
+        self._call('force_update')
+
+
+class _FakePublisher(object):
+    def __init__(self, callback):
+        self.publish = callback
+
+    def unregister(self):
+        pass
+
+
+class BenchmarkRappManager(rocon_app_manager.RappManager):
+    '''
+      Rapp manager wired up to a stand-in gateway.
+    '''
+    gateway = None
+
+    def _init_gateway_services(self):
+        gateway = BenchmarkRappManager.gateway
+        self._gateway_services = {}
+        for name in ['remote_gateway_info', 'flip', 'advertise', 'pull']:
+            self._gateway_services[name] = getattr(gateway, name)
+        self._gateway_publishers = {}
+        self._gateway_publishers['force_update'] = _FakePublisher(gateway.force_update)
+
+    def _init_gateway_subscribers(self):
+        self._gateway_subscribers = {}
+        self._ros_gateway_info_callback(BenchmarkRappManager.gateway.gateway_info())
+
+    def shutdown(self):
+        '''
+          Stop everything that would otherwise carry on in the background and skew
+          the timings of the next manager.
+        '''
+        self._standby_rapps = []
+        if self._rapp_watcher is not None:
+            self._rapp_watcher.shutdown()
+            self._rapp_watcher = None
+        self._remote_gateways.shutdown()
+        if getattr(self, '_diagnostics_timer', None) is not None:
+            self._diagnostics_timer.shutdown()
+        self._diagnostics_publisher.unregister()
+        for service in self._services.values():
+            service.shutdown()
+        for publisher in self._publishers.values():
+            publisher.unregister()
+        self._services = {}
+        self._publishers = {}
+
+##############################################################################
+# Measurements
+##############################################################################
+
+
+def percentiles(durations):
+    '''
+      @return count, mean, p50, p90, p99 and max (in milliseconds)
+      @rtype dict
+    '''
+    if not durations:
+        return {'count': 0}
+    durations = sorted(durations)
+
+    def percentile(p):
+        return 1000.0 * durations[min(len(durations) - 1, int(round(p / 100.0 * (len(durations) - 1))))]
+    return {'count': len(durations),
+            'mean': 1000.0 * sum(durations) / len(durations),
+            'p50': percentile(50),
+            'p90': percentile(90),
+            'p99': percentile(99),
+            'max': 1000.0 * durations[-1]}
+
+
+def max_rss():
+    '''
+      @return peak resident memory of this process (MB)
+      @rtype float
+    '''
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def timed(method, *args):
+    start = time.time()
+    result = method(*args)
+    return time.time() - start, result
+
+
+def create_manager(index_path):
+    rospy.set_param('~rapp_index', index_path)
+    duration, manager = timed(BenchmarkRappManager)
+    return duration, manager
+
+
+def run(args, directory):
+    results = {'rapps': args.rapps, 'gateway_latency': args.gateway_latency}
+
+    start = time.time()
+    names = generate_rapps(directory, args.rapps, args.icon_size, args.node)
+    results['generate_time'] = time.time() - start
+    os.environ['ROS_PACKAGE_PATH'] = directory + os.pathsep + os.environ.get('ROS_PACKAGE_PATH', '')
+
+    master = rosmaster.master.Master(args.port)
+    master.start()
+    os.environ['ROS_MASTER_URI'] = master.uri
+    rospy.init_node('benchmark_rapp_manager', disable_signals=True)
+    rospy.set_param('/run_id', str(uuid.uuid1()))
+    rospy.set_param('~robot_name', 'benchmark')
+    rospy.set_param('~rapp_lists', package_name + '/benchmark.rapps')
+    rospy.set_param('~max_running_rapps', args.max_running)
+    rospy.set_param('~rapp_ready_timeout', args.ready_timeout)
+    rospy.set_param('~latency_diagnostics_period', 0.0)
+    rospy.set_param('~watch_rapp_lists', False)  # don't time a watcher over thousands of generated files
+    BenchmarkRappManager.gateway = FakeGateway('benchmark_gateway', '127.0.0.1', args.gateway_latency)
+    index_path = os.path.join(directory, 'rapp_index.pickle')
+    rss_before = max_rss()
+
+    # Startup
+    results['startup_cold'], manager = create_manager(index_path)
+    manager.shutdown()
+    results['startup_warm'], manager = create_manager(index_path)
+    results['memory_startup'] = max_rss() - rss_before
+    print("Startup : cold %.3fs, warm (rapp index) %.3fs" % (results['startup_cold'], results['startup_warm']))
+
+    # list_apps
+    list_apps = rospy.ServiceProxy(manager._service_names['list_apps'], rapp_manager_srvs.GetAppList)
+    list_apps.wait_for_service(5.0)
+    durations = [timed(list_apps)[0] for unused_i in range(args.list_calls)]
+    results['list_apps'] = percentiles(durations)
+    if durations:
+        results['list_apps_per_second'] = len(durations) / sum(durations)
+        print("list_apps : %.1f calls/s" % results['list_apps_per_second'])
+
+    # Invite (so starts and stops exercise the gateway flips too)
+    invite = rospy.ServiceProxy(manager._service_names['invite'], rapp_manager_srvs.Invite)
+    duration, response = timed(invite, rapp_manager_srvs.InviteRequest(remote_target_name='benchmark_remote', application_namespace='', cancel=False))
+    results['invite'] = percentiles([duration])
+    if not response.result:
+        sys.stderr.write("Benchmark : invitation was refused [%s]\n" % response.message)
+
+    # start/stop
+    start_app = rospy.ServiceProxy(manager._service_names['start_app'], rapp_manager_srvs.StartApp)
+    stop_app = rospy.ServiceProxy(manager._service_names['stop_app'], rapp_manager_srvs.StopApp)
+    start_durations = []
+    stop_durations = []
+    failures = 0
+    for i in range(args.cycles):
+        duration, response = timed(start_app, rapp_manager_srvs.StartAppRequest(names[i % len(names)], []))
+        if not response.started:
+            failures += 1
+            continue
+        start_durations.append(duration)
+        duration, response = timed(stop_app, rapp_manager_srvs.StopAppRequest())
+        stop_durations.append(duration)
+    results['start_app'] = percentiles(start_durations)
+    results['stop_app'] = percentiles(stop_durations)
+    results['start_failures'] = failures
+    results['memory_total'] = max_rss() - rss_before
+    results['gateway_calls'] = BenchmarkRappManager.gateway.calls
+
+    # the manager's own per-phase breakdown
+    results['phases'] = {}
+    for status in manager._latency.to_msgs():
+        if '[' not in status.name:
+            results['phases'][status.name.split(' : ')[-1]] = dict((kv.key, kv.value) for kv in status.values if not kv.key.startswith('<') and not kv.key.startswith('>'))
+    manager.shutdown()
+    rospy.signal_shutdown('benchmark finished')
+    master.stop()
+    return results
+
+
+def print_results(results):
+    for key in ['list_apps', 'invite', 'start_app', 'stop_app']:
+        r = results[key]
+        if r['count']:
+            print("%-10s: n=%d mean %.1fms p50 %.1fms p90 %.1fms p99 %.1fms max %.1fms" % (key, r['count'], r['mean'], r['p50'], r['p90'], r['p99'], r['max']))
+    if results['start_failures']:
+        print("start_app failures : %d" % results['start_failures'])
+    print("Memory : %.1fMB at startup, %.1fMB in total (peak rss growth)" % (results['memory_startup'], results['memory_total']))
+    for phase in sorted(results['phases']):
+        values = results['phases'][phase]
+        print("  %-30s p50 %ss p90 %ss (n=%s)" % (phase, values.get('p50', '-'), values.get('p90', '-'), values['count']))
+
+##############################################################################
+# Main
+##############################################################################
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the rapp manager with generated rapps and a stand-in gateway.')
+    parser.add_argument('-n', '--rapps', type=int, default=500, help='number of rapps to generate [%(default)s]')
+    parser.add_argument('-l', '--gateway-latency', type=float, default=0.01, help='latency (s) of each gateway service call [%(default)s]')
+    parser.add_argument('-c', '--cycles', type=int, default=50, help='number of start/stop cycles [%(default)s]')
+    parser.add_argument('--list-calls', type=int, default=100, help='number of list_apps calls [%(default)s]')
+    parser.add_argument('--icon-size', type=int, default=4096, help='size (bytes) of each rapp icon, 0 for none [%(default)s]')
+    parser.add_argument('--node', default=None, help='pkg/type of a node for each rapp to launch, e.g. rospy_tutorials/talker (default: none)')
+    parser.add_argument('--max-running', type=int, default=1, help='the max_running_rapps parameter [%(default)s]')
+    parser.add_argument('--ready-timeout', type=float, default=5.0, help='the rapp_ready_timeout parameter [%(default)s]')
+    parser.add_argument('--port', type=int, default=0, help='port for the in-process master (0 for any free port) [%(default)s]')
+    parser.add_argument('--json', default=None, help='also write the results to this file')
+    parser.add_argument('--keep', action='store_true', help='keep the generated rapps')
+    args = parser.parse_args(rospy.myargv()[1:])
+
+    directory = tempfile.mkdtemp(prefix='rapp_manager_benchmark_')
+    try:
+        results = run(args, directory)
+    finally:
+        if args.keep:
+            print("Benchmark : generated rapps kept in [%s]" % directory)
+        else:
+            shutil.rmtree(directory, ignore_errors=True)
+    print_results(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
@@ -8,13 +8,13 @@
 ##############################################################################
 
 import sys
-import rosgraph
+import time
+import threading
 import rospy
 import gateway_msgs.msg as gateway_msgs
 import gateway_msgs.srv as gateway_srvs
 import rocon_app_manager_msgs.srv as rocon_app_manager_srvs
 import rocon_app_manager_msgs.msg as rocon_app_manager_msgs
-import rocon_utilities
 import rocon_utilities.console as console
 import std_msgs.msg as std_msgs
 
@@ -22,80 +22,143 @@ import std_msgs.msg as std_msgs
 # Methods
 ##############################################################################
 
-def local_gateway_name():
-    
-    gateway_name = None
-    gateway_info_service = rocon_utilities.SubscriberProxy('~gateway_info', gateway_msgs.GatewayInfo)
-    while not rospy.is_shutdown():
-        gateway_info = gateway_info_service(timeout=rospy.Duration(0.2))
-        if gateway_info:
-            if gateway_info.connected:
-                gateway_name = gateway_info.name
-                break
-        rospy.rostime.wallsleep(1.0)
-    return gateway_name
-
-def remote_gateway_name():
-    '''
-      Assumption: note that the remote gateway info in the paired master system
-      should only ever show at most, one remote gateway. That should be the
-      private counterpart (we're not using zeroconf over here).
-      
-      @return namespace of the app manager (matches the remote gateway name)
-      @rtype string or None : string does not yet prefix a leading '/'
+class InvitationHandler():
     '''
-    remote_gateway_info_service = rospy.ServiceProxy('~remote_gateway_info', gateway_srvs.RemoteGatewayInfo)
-    remote_gateway_name = None
-    while not rospy.is_shutdown():
-        try:
-            rospy.wait_for_service('~remote_gateway_info', timeout=0.3)
-        except rospy.exceptions.ROSException:  # timeout exceeded
-            continue
-        except (rospy.exceptions.ROSInterruptException, rospy.service.ServiceException):  # shutdown exception
-            sys.exit(0)
-        remote_gateway_info = remote_gateway_info_service()
-        if len(remote_gateway_info.gateways) == 1:
-            remote_gateway_name = remote_gateway_info.gateways[0].name
-            break
-        elif len(remote_gateway_info.gateways) == 2:
-            console.error("Pairing Master : found two remote gateways when there should only ever be one.")
-            sys.exit(1)
-    if remote_gateway_name is None:
-        # probably shutting down
-        #console.error("Pairing Master : app_manager_namespace returned 'None', probably shutting down.")
-        sys.exit(0)
-    return remote_gateway_name
+      Discovers what it needs to relay invitations and then watches over the android client.
 
-class InvitationHandler():
+      Discovery is a small state machine, with each piece found concurrently:
+
+      - local gateway name : from our gateway's gateway_info (callback)
+      - remote gateway name : the one remote gateway our gateway sees (the private master's)
+      - remote invite service : the app manager's invite service, flipped in by the private master
+
+      Once the local gateway name and the remote invite service are known, the relay is ready.
+      The ~invite relay is served from the start, invitations that arrive early wait (up to the
+      discovery timeout) for it to become ready.
+    '''
     
-    __slots__ = ['local_gateway_name', 'remote_gateway_name', 'remote_invite_service', 'relay_invitation_server', 'watchdog_flag'] 
+    __slots__ = ['local_gateway_name', 'remote_gateway_name', 'remote_invite_service', 'relay_invitation_server', 'watchdog_flag',
+                 'auto_invite', 'release_timeout', 'invited', 'last_heartbeat', 'watchdog_subscriber', 'android_app_name_subscriber',
+                 'gateway_info_subscriber', 'deadline', 'ready', 'failed', 'lock']
     
-    def __init__(self, local_gateway_name, remote_gateway_name, auto_invite):
+    def __init__(self, auto_invite, release_timeout=2.0, discovery_timeout=0.0):
+        '''
+          @param discovery_timeout : time (s) allowed for discovery, zero to wait indefinitely
+          @type float
+        '''
         self.watchdog_flag = True
-        self.local_gateway_name = local_gateway_name
-        self.remote_gateway_name = remote_gateway_name
+        self.release_timeout = release_timeout
+        self.invited = False  # whether we have the app manager's remote control (as far as we know)
+        self.last_heartbeat = None  # wall time the android client last published its app name
+        self.local_gateway_name = None
+        self.remote_gateway_name = None
+        self.remote_invite_service = None
         self.auto_invite = auto_invite
-        remote_invite_service_name = '/' + remote_gateway_name + '/invite'
-        # Speed up the gateway watcher for convenience (otherwise it'll take like 5 seconds to pick up the app manager
-        gateway_watcher_period_service = rospy.ServiceProxy('~set_watcher_period', gateway_srvs.SetWatcherPeriod)
-        unused_watcher_period_response = gateway_watcher_period_service(gateway_srvs.SetWatcherPeriodRequest(0.25)) 
-        # Detect the app manager
-        self.remote_invite_service = rospy.ServiceProxy(remote_invite_service_name, rocon_app_manager_srvs.Invite)
-        rospy.loginfo("Pairing Master : waiting for invitation service [%s]" % remote_invite_service_name)
-        try:
-            rospy.wait_for_service(remote_invite_service_name)
-        except rospy.exceptions.ROSInterruptException:
-            sys.exit(0)  # Ros shutdown
-        # Reset the watcher period to its default.
-        unused_watcher_period_response = gateway_watcher_period_service(gateway_srvs.SetWatcherPeriodRequest(-1.0))
+        self.deadline = time.time() + discovery_timeout if discovery_timeout > 0 else None
+        self.ready = threading.Event()
+        self.failed = False
+        self.lock = threading.Lock()
+        if self.auto_invite:
+            rospy.loginfo("Pairing Master : auto-invite mode, disabling the cleanup watchdog.")
+            self.watchdog_flag = False
         # Set up services 
-        rospy.loginfo("Pairing Master : initialising simple client invitation service [%s]" % remote_invite_service_name)
+        rospy.loginfo("Pairing Master : initialising simple client invitation service")
         self.relay_invitation_server = rospy.Service('~invite', rocon_app_manager_srvs.SimpleInvite, self.relayed_invitation)
         self.watchdog_subscriber = rospy.Subscriber('~watchdog', std_msgs.Bool, self.watchdog_flag_cb)
-        
+        # The android clients publish on this while they are up. Its connections are maintained
+        # by the master's publisher updates, so checking them is local (no master calls).
+        self.android_app_name_subscriber = rospy.Subscriber('/pairing_master/android_app_name', rospy.AnyMsg, self.android_app_name_cb)
+        # Discovery
+        self.gateway_info_subscriber = rospy.Subscriber('~gateway_info', gateway_msgs.GatewayInfo, self.gateway_info_cb)
+        thread = threading.Thread(target=self.discover_remote_invite_service)
+        thread.daemon = True
+        thread.start()
+
+    def time_left(self):
+        '''
+          @return time (s) left for discovery, None if there is no deadline
+          @rtype float
+        '''
+        return None if self.deadline is None else max(0.0, self.deadline - time.time())
+
+    def wait_until_ready(self):
+        '''
+          @return true if discovery completed, false if it timed out, failed or ros shut down
+          @rtype bool
+        '''
+        while not rospy.is_shutdown() and not self.failed:
+            time_left = self.time_left()
+            if time_left == 0.0:
+                break
+            if self.ready.wait(0.25 if time_left is None else min(0.25, time_left)):
+                return True
+        return self.ready.is_set()
+
+    def gateway_info_cb(self, msg):
+        if msg.connected and self.local_gateway_name is None:
+            rospy.loginfo("Pairing Master : local gateway name [%s]" % msg.name)
+            self.local_gateway_name = msg.name
+            self.update()
+
+    def discover_remote_invite_service(self):
+        '''
+          Find the remote gateway and wait for its app manager's invite service.
+
+          Assumption: note that the remote gateway info in the paired master system
+          should only ever show at most, one remote gateway. That should be the
+          private counterpart (we're not using zeroconf over here).
+        '''
+        remote_gateway_info_service = rospy.ServiceProxy('~remote_gateway_info', gateway_srvs.RemoteGatewayInfo)
+        gateway_watcher_period_service = rospy.ServiceProxy('~set_watcher_period', gateway_srvs.SetWatcherPeriod)
+        watcher_period_changed = False
+        try:
+            while self.remote_invite_service is None:
+                if rospy.is_shutdown() or self.time_left() == 0.0:
+                    return
+                try:
+                    if not watcher_period_changed:
+                        # Speed up the gateway watcher for convenience (otherwise it'll take like 5 seconds to pick up the app manager
+                        gateway_watcher_period_service(gateway_srvs.SetWatcherPeriodRequest(0.25))
+                        watcher_period_changed = True
+                    if self.remote_gateway_name is None:
+                        remote_gateway_info = remote_gateway_info_service()
+                        if len(remote_gateway_info.gateways) == 1:
+                            self.remote_gateway_name = remote_gateway_info.gateways[0].name
+                            rospy.loginfo("Pairing Master : remote gateway name [%s]" % self.remote_gateway_name)
+                            rospy.loginfo("Pairing Master : waiting for invitation service [/%s/invite]" % self.remote_gateway_name)
+                        elif len(remote_gateway_info.gateways) > 1:
+                            console.logerror("Pairing Master : found %s remote gateways when there should only ever be one." % len(remote_gateway_info.gateways))
+                            self.failed = True
+                            return
+                    if self.remote_gateway_name is not None:
+                        remote_invite_service_name = '/' + self.remote_gateway_name + '/invite'
+                        rospy.wait_for_service(remote_invite_service_name, timeout=0.25)
+                        self.remote_invite_service = rospy.ServiceProxy(remote_invite_service_name, rocon_app_manager_srvs.Invite)
+                        self.update()
+                        return
+                except rospy.exceptions.ROSInterruptException:  # shutdown exception
+                    return
+                except (rospy.exceptions.ROSException, rospy.service.ServiceException):
+                    pass  # not up yet (wait timed out or the gateway isn't there)
+                rospy.rostime.wallsleep(0.25)
+        finally:
+            if watcher_period_changed and not rospy.is_shutdown():
+                try:
+                    # Reset the watcher period to its default.
+                    gateway_watcher_period_service(gateway_srvs.SetWatcherPeriodRequest(-1.0))
+                except (rospy.exceptions.ROSException, rospy.service.ServiceException):
+                    pass
+
+    def update(self):
+        '''
+          Called as each piece is discovered, flags the relay as ready once everything needed is in.
+        '''
+        with self.lock:
+            if self.ready.is_set() or self.local_gateway_name is None or self.remote_invite_service is None:
+                return
+            self.ready.set()
+        rospy.loginfo("Pairing Master : ready to relay invitations to [%s]" % self.remote_gateway_name)
         if self.auto_invite:
-            rospy.loginfo("Pairing Master : auto-invite mode, disabling the cleanup watchdog.")
-            self.watchdog_flag = False
             self.relayed_invitation(rocon_app_manager_srvs.SimpleInviteRequest(False))
 
     def watchdog_flag_cb(self, incoming):
@@ -111,57 +174,57 @@ class InvitationHandler():
         else:
             rospy.loginfo("Pairing Master : disabling the cleanup watchdog.")
         
-    def is_pairing_device_present(self, master):
-        pubs, unused_subs, unused_xxx = master.getSystemState()
-        android_app_name_publishers = [x for x in pubs if x[0] == '/pairing_master/android_app_name']
-        if len(android_app_name_publishers) == 0:
-            return False
-        else:
+    def android_app_name_cb(self, unused_msg):
+        '''
+          Any message from the android client counts as a heartbeat.
+        '''
+        self.last_heartbeat = time.time()
+
+    def is_pairing_device_present(self):
+        '''
+          The android client is present if it is connected to our android_app_name
+          subscriber or has published on it within the release timeout.
+        '''
+        if self.android_app_name_subscriber.get_num_connections() > 0:
             return True
+        return self.last_heartbeat is not None and time.time() - self.last_heartbeat < self.release_timeout
         
     def spin(self):
         '''
-          If the private master's robot app manager is currently being remote controlled by us (start_app and stop_app
-          is available), then it checks to make sure the android client is there. If not, it uninvites the private
-          robot app manager so that it is free to be remote controlled by other sources.
+          If the private master's robot app manager is currently being remote controlled by us (we relayed an
+          invitation), then it checks to make sure the android client is there. If it has been gone for longer
+          than the release timeout, it uninvites the private robot app manager so that it is free to be remote
+          controlled by other sources.
           
-          To check that it is there, it looks to see if either the android remocon or android remocon app is
-          publishing to the /pairing/android_app_name topic.
+          To check that it is there, it looks for either the android remocon or android remocon app
+          publishing to the /pairing_master/android_app_name topic (see is_pairing_device_present). This only
+          looks at local state, so the loop is cheap.
         '''
-        master = rosgraph.Master(rospy.get_name())
-        flagged_for_release_count = 0
+        absent_since = None
         while not rospy.is_shutdown():
-            if not self.watchdog_flag:
-                rospy.rostime.wallsleep(1.0)
-            else:
-                if flagged_for_release_count == 0:
-                    rospy.rostime.wallsleep(1.0)
-                else:
-                    rospy.rostime.wallsleep(0.25)
-                try:
-                    # If not found, exceptions get thrown.
-                    result = master.lookupService('/' + self.remote_gateway_name + '/start_app')
-                    # Found, so check that an android client is connected.
-                    if not self.is_pairing_device_present(master):
-                        # Don't automatically disengage as sometimes the start_app handle will appear before the android
-                        # client's handle. Put it under observation
-                        flagged_for_release_count += 1
-                        if flagged_for_release_count == 5:
-                            # Android client disappeared, probably crashed, so release control (uninvite)
-                            rospy.loginfo("Pairing Master : android client disappeared, releasing remote control.")
-                            remote_response = self.remote_invite_service(rocon_app_manager_srvs.InviteRequest(
-                                                                     remote_target_name=self.local_gateway_name,
-                                                                     application_namespace='',
-                                                                     cancel=True))
-                            flagged_for_release_count = 0
-                    else:
-                        flagged_for_release_count = 0
-                except rospy.service.ServiceException:
-                    pass # Was in the middle of uninviting when ros shutdown
-                except rosgraph.masterapi.Error:
-                    pass
-                except rosgraph.masterapi.Failure:
-                    pass
+            rospy.rostime.wallsleep(0.25)
+            if not self.watchdog_flag or not self.invited or self.is_pairing_device_present():
+                absent_since = None
+                continue
+            # Don't automatically disengage as sometimes the start_app handle will appear before the android
+            # client's handle. Put it under observation
+            if absent_since is None:
+                absent_since = time.time()
+                continue
+            if time.time() - absent_since < self.release_timeout:
+                continue
+            # Android client disappeared, probably crashed, so release control (uninvite)
+            rospy.loginfo("Pairing Master : android client disappeared, releasing remote control.")
+            absent_since = None
+            try:
+                remote_response = self.remote_invite_service(rocon_app_manager_srvs.InviteRequest(
+                                                         remote_target_name=self.local_gateway_name,
+                                                         application_namespace='',
+                                                         cancel=True))
+                if remote_response.result:
+                    self.invited = False
+            except rospy.service.ServiceException:
+                pass # Was in the middle of uninviting when ros shutdown
     
     def relayed_invitation(self, req):
         '''
@@ -172,12 +235,18 @@ class InvitationHandler():
         if self.auto_invite and req.cancel:
             # Don't cancel, just ignore it and send back a true response (not broken).
             return rocon_app_manager_srvs.SimpleInviteResponse(True)
+        if not self.wait_until_ready():
+            console.logerror("Pairing Master : not ready to relay invitations yet (still discovering the app manager).")
+            return rocon_app_manager_srvs.SimpleInviteResponse(False)
+        remote_response = rocon_app_manager_srvs.InviteResponse(result=False)
         try:
             rospy.loginfo("Pairing Master : inviting the private master's application manager.")
             remote_response = self.remote_invite_service(rocon_app_manager_srvs.InviteRequest(
                                                          remote_target_name=self.local_gateway_name,
                                                          application_namespace='',
                                                          cancel=req.cancel))
+            if remote_response.result:
+                self.invited = not req.cancel
         except rospy.service.ServiceException:  # service call failed
             console.logerror("Pairing Master: remote invitation failed to connect.")
         except rospy.exceptions.ROSInterruptException:  # shutdown exception
@@ -191,13 +260,16 @@ class InvitationHandler():
 if __name__ == '__main__':
     rospy.init_node('pairing_master')
     auto_invite = rospy.get_param("~auto_invite", "false")
+    # how long (s) the android client may be gone before its remote control of the app manager is released
+    release_timeout = rospy.get_param("~release_timeout", 2.0)
+    # how long (s) to wait for the gateways and the app manager to show up before giving up (and
+    # exiting), zero to wait indefinitely - the private master can take a long while to boot
+    discovery_timeout = rospy.get_param("~discovery_timeout", 0.0)
     rospy.loginfo("Pairing Master : auto-inviting %s" % auto_invite)
-    local_gateway_name = local_gateway_name()
-    if local_gateway_name is None:
-        console.logerror("Pairing Master : shutting down.")
-        sys.exit(1)
-    rospy.loginfo("Pairing Master : local gateway name [%s]" % local_gateway_name)
-    remote_gateway_name = remote_gateway_name()
-    rospy.loginfo("Pairing Master : remote gateway name [%s]" % remote_gateway_name)
-    invitation_handler = InvitationHandler(local_gateway_name, remote_gateway_name, auto_invite)
+    invitation_handler = InvitationHandler(auto_invite, release_timeout, discovery_timeout)
+    if not invitation_handler.wait_until_ready():
+        if not rospy.is_shutdown():
+            console.logerror("Pairing Master : failed to discover the gateways and app manager, shutting down.")
+            sys.exit(1)
+        sys.exit(0)
     invitation_handler.spin()
@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+#
+# License: BSD
+#   https://raw.github.com/robotics-in-concert/rocon_app_platform/master/rocon_app_manager/LICENSE
+#
+##############################################################################
+# Imports
+##############################################################################
+
+import sys
+import argparse
+import rocon_utilities
+import rocon_app_manager.rapp_index as rapp_index
+from rocon_app_manager.rapp_list import RappListFile
+from rocon_app_manager.rapp_loader import RappLoader
+
+##############################################################################
+# Main
+##############################################################################
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Prebuild the compiled rapp index used by the rapp manager at startup.')
+    parser.add_argument('rapp_lists', nargs='+', help='rapp list resource names, e.g. rocon_apps/rocon.rapps')
+    parser.add_argument('-i', '--index', default=rapp_index.default_index_path(), help='path to the rapp index [%(default)s]')
+    parser.add_argument('-j', '--jobs', type=int, default=0, help='worker processes for parsing rapps, 0 for one per cpu [%(default)s]')
+    args = parser.parse_args()
+
+    index = rapp_index.RappIndex(args.index)
+    loader = RappLoader(rapp_index=index, workers=args.jobs)
+    count = 0
+    try:
+        for resource_name in args.rapp_lists:
+            try:
+                filename = rocon_utilities.find_resource_from_string(resource_name, rospack=loader.rospack)
+                count += len(RappListFile(filename, loader=loader).available_apps)
+            except Exception as e:
+                sys.stderr.write("Rapp Indexer : failed to load rapp list [%s][%s]\n" % (resource_name, str(e)))
+                sys.exit(1)
+    finally:
+        loader.close()
+    if not index.save(prune=True):
+        sys.exit(1)
+    print("Rapp Indexer : indexed %s rapps [%s]" % (count, args.index))
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+#
+# License: BSD
+#   https://raw.github.com/robotics-in-concert/rocon_app_platform/master/rocon_app_manager/LICENSE
+#
+##############################################################################
+# Overview
+##############################################################################
+'''
+ Pre-serialized app list messages. Each rapp caches its own serialized
+ App message, so an app list can be assembled by concatenating those
+ buffers instead of re-serializing every app (and its icon) whenever a
+ single rapp changes status. Latched publishers also re-send the cached
+ buffer to late subscribers without any further work.
+'''
+##############################################################################
+# Imports
+##############################################################################
+
+import struct
+from cStringIO import StringIO
+import rocon_app_manager_msgs.msg as rapp_manager_msgs
+import rocon_app_manager_msgs.srv as rapp_manager_srvs
+
+##############################################################################
+# Methods
+##############################################################################
+
+
+def serialize_msg(msg):
+    '''
+      @param msg : any ros message
+      @type genpy.Message
+      @return the serialized message
+      @rtype str
+    '''
+    buff = StringIO()
+    msg.serialize(buff)
+    return buff.getvalue()
+
+
+def _serialize_app_arrays(msg_class, app_buffers):
+    '''
+      Serialize a message that consists solely of App[] fields (e.g. AppList).
+      Slots are in field order for generated message classes.
+
+      @param app_buffers : serialized App messages for each field, keyed by field name
+      @type { str : [str] }
+    '''
+    return ''.join(struct.pack('<I', len(app_buffers[field])) + ''.join(app_buffers[field]) for field in msg_class.__slots__)
+
+##############################################################################
+# Classes
+##############################################################################
+
+
+class SerializedAppList(rapp_manager_msgs.AppList):
+    '''
+      An AppList that serializes from a pre-built buffer. The fields are
+      still filled so it can be inspected like any other AppList, but they
+      are not used for serialization and must not be modified.
+    '''
+    __slots__ = ['_buff']
+
+    def __init__(self, available_apps, running_apps):
+        '''
+          @param available_apps : (msg, serialized msg) pairs
+          @type [(rapp_manager_msgs.App, str)]
+          @param running_apps : (msg, serialized msg) pairs
+          @type [(rapp_manager_msgs.App, str)]
+        '''
+        # no keyword args, genpy checks them against __slots__ (only '_buff' here)
+        super(SerializedAppList, self).__init__()
+        self.available_apps = [a for (a, unused_b) in available_apps]
+        self.running_apps = [a for (a, unused_b) in running_apps]
+        self._buff = _serialize_app_arrays(rapp_manager_msgs.AppList,
+                                           {'available_apps': [b for (unused_a, b) in available_apps],
+                                            'running_apps': [b for (unused_a, b) in running_apps]})
+
+    def serialize(self, buff):
+        buff.write(self._buff)
+
+
+class SerializedGetAppListResponse(rapp_manager_srvs.GetAppListResponse):
+    '''
+      The list_apps service response equivalent of SerializedAppList.
+    '''
+    __slots__ = ['_buff']
+
+    def __init__(self, available_apps, running_apps):
+        super(SerializedGetAppListResponse, self).__init__()
+        self.available_apps = [a for (a, unused_b) in available_apps]
+        self.running_apps = [a for (a, unused_b) in running_apps]
+        self._buff = _serialize_app_arrays(rapp_manager_srvs.GetAppListResponse,
+                                           {'available_apps': [b for (unused_a, b) in available_apps],
+                                            'running_apps': [b for (unused_a, b) in running_apps]})
+
+    def serialize(self, buff):
+        buff.write(self._buff)
@@ -26,6 +26,13 @@ class NotFoundException(AppException):
     pass
 
 
+class AdmissionException(AppException):
+    """
+      App could not be admitted to run (e.g. its share limit is reached).
+    """
+    pass
+
+
 class IncompatibleAppException(AppException):
     """
       App not compatible with this platform.
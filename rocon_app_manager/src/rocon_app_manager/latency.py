@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+#
+# License: BSD
+#   https://raw.github.com/robotics-in-concert/rocon_app_platform/master/rocon_app_manager/LICENSE
+#
+##############################################################################
+# Overview
+##############################################################################
+'''
+ Latency instrumentation for the rapp manager's transitions (start, stop,
+ invite). Each phase of a transition is timed as a span and aggregated into
+ a histogram, both across all rapps and per rapp.
+'''
+##############################################################################
+# Imports
+##############################################################################
+
+import time
+import bisect
+import threading
+import contextlib
+import diagnostic_msgs.msg as diagnostic_msgs
+
+##############################################################################
+# Methods
+##############################################################################
+
+
+@contextlib.contextmanager
+def span(tracker, transition, phase, rapp=None):
+    '''
+      Time the enclosed block as a phase of a transition, e.g.
+
+      @code
+      with span(tracker, 'start_app', 'launch', 'rocon_apps/chirp'):
+          launch.start()
+      @endcode
+
+      @param tracker : where to record the span, if None this does nothing.
+      @type LatencyTracker
+      @param transition : e.g. start_app, stop_app, invite
+      @type str
+      @param phase : e.g. load_config, launch, flip
+      @type str
+      @param rapp : the rapp undergoing the transition (if any)
+      @type str
+    '''
+    start = time.time()
+    try:
+        yield
+    finally:
+        if tracker is not None:
+            tracker.record(transition, phase, time.time() - start, rapp)
+
+##############################################################################
+# Classes
+##############################################################################
+
+
+class LatencyHistogram(object):
+    '''
+      Log scale histogram of durations, 1ms to ~1min. Percentiles are
+      approximated by the upper bound of the bucket they fall in.
+    '''
+    __slots__ = ['count', 'total', 'minimum', 'maximum', '_buckets']
+
+    bounds = [0.001 * 2 ** i for i in range(17)]  # upper bounds (s), anything beyond goes in the last bucket
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.minimum = None
+        self.maximum = None
+        self._buckets = [0] * (len(LatencyHistogram.bounds) + 1)
+
+    def add(self, duration):
+        self.count += 1
+        self.total += duration
+        self.minimum = duration if self.minimum is None else min(self.minimum, duration)
+        self.maximum = duration if self.maximum is None else max(self.maximum, duration)
+        self._buckets[bisect.bisect_left(LatencyHistogram.bounds, duration)] += 1
+
+    def percentile(self, percent):
+        '''
+          @param percent : 0-100
+          @type float
+          @return approximate duration (s) under which the given percentage of samples fall, None if empty
+          @rtype float
+        '''
+        if self.count == 0:
+            return None
+        target = self.count * percent / 100.0
+        accumulated = 0
+        for i, bucket in enumerate(self._buckets):
+            accumulated += bucket
+            if accumulated >= target and bucket:
+                return min(LatencyHistogram.bounds[i], self.maximum) if i < len(LatencyHistogram.bounds) else self.maximum
+        return self.maximum
+
+    def to_key_values(self):
+        values = [diagnostic_msgs.KeyValue('count', str(self.count))]
+        if self.count:
+            values.append(diagnostic_msgs.KeyValue('mean', '%.4f' % (self.total / self.count)))
+            values.append(diagnostic_msgs.KeyValue('min', '%.4f' % self.minimum))
+            values.append(diagnostic_msgs.KeyValue('max', '%.4f' % self.maximum))
+            for percent in [50, 90, 99]:
+                values.append(diagnostic_msgs.KeyValue('p%s' % percent, '%.4f' % self.percentile(percent)))
+        for i, bucket in enumerate(self._buckets):
+            if bucket:
+                label = '<=%gs' % LatencyHistogram.bounds[i] if i < len(LatencyHistogram.bounds) else '>%gs' % LatencyHistogram.bounds[-1]
+                values.append(diagnostic_msgs.KeyValue(label, str(bucket)))
+        return values
+
+
+class LatencyTracker(object):
+    '''
+      Collects spans into histograms keyed by (transition, phase), both in
+      aggregate and per rapp.
+    '''
+    __slots__ = ['_histograms', '_lock']
+
+    def __init__(self):
+        self._histograms = {}  # (transition, phase, rapp or None) : LatencyHistogram
+        self._lock = threading.Lock()
+
+    def record(self, transition, phase, duration, rapp=None):
+        keys = [(transition, phase, None)]
+        if rapp is not None:
+            keys.append((transition, phase, rapp))
+        with self._lock:
+            for key in keys:
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    histogram = self._histograms[key] = LatencyHistogram()
+                histogram.add(duration)
+
+    def to_msgs(self, hardware_id=''):
+        '''
+          @param hardware_id : identifies this robot/app manager in the statuses
+          @type str
+          @return a status for each histogram, aggregate histograms first.
+          @rtype [diagnostic_msgs.DiagnosticStatus]
+        '''
+        statuses = []
+        with self._lock:
+            for (transition, phase, rapp) in sorted(self._histograms.keys(), key=lambda k: (k[2] is not None, k)):
+                status = diagnostic_msgs.DiagnosticStatus()
+                status.level = diagnostic_msgs.DiagnosticStatus.OK
+                status.name = "App Manager Latency : %s/%s" % (transition, phase) + (" [%s]" % rapp if rapp else "")
+                status.hardware_id = hardware_id
+                status.message = "%s samples" % self._histograms[(transition, phase, rapp)].count
+                status.values = self._histograms[(transition, phase, rapp)].to_key_values()
+                statuses.append(status)
+        return statuses
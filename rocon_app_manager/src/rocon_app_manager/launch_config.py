@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+#
+# License: BSD
+#   https://raw.github.com/robotics-in-concert/rocon_app_platform/master/rocon_app_manager/LICENSE
+#
+##############################################################################
+# Overview
+##############################################################################
+'''
+ Parsed roslaunch configurations for rapps. Rapps are launched via a small
+ wrapper that pushes the rapp's launch file down into a namespace and passes
+ in the standard args. Parsing it (and everything it includes) is the bulk
+ of the work in starting a rapp, so the parsed configurations are built in
+ memory (no temporary launch files) and kept as templates to be copied for
+ each start.
+'''
+##############################################################################
+# Imports
+##############################################################################
+
+import os
+import copy
+import logging
+import threading
+import collections
+import roslaunch.xmlloader
+from rosgraph.names import canonicalize_name
+from roslaunch.config import load_config_default
+
+##############################################################################
+# Methods
+##############################################################################
+
+
+def file_stamps(filenames):
+    '''
+      @return modification times of the files (None for missing files)
+      @rtype { str : float }
+    '''
+    stamps = {}
+    for filename in filenames:
+        try:
+            stamps[filename] = os.stat(filename).st_mtime
+        except OSError:
+            stamps[filename] = None
+    return stamps
+
+
+def stamps_unchanged(stamps):
+    '''
+      @param stamps : modification times as returned by file_stamps()
+      @type { str : float }
+      @return true if none of the files have been modified (or deleted/created) since
+      @rtype bool
+    '''
+    return file_stamps(stamps.keys()) == stamps
+
+##############################################################################
+# Classes
+##############################################################################
+
+
+class DependencyRecordingXmlLoader(roslaunch.xmlloader.XmlLoader):
+    '''
+      Launch file loader that records every launch file it is asked to
+      include, so parsed configurations can be invalidated when any of them
+      change. Files behind an 'if'/'unless' that is false are recorded too,
+      which only means the odd unnecessary reparse.
+    '''
+    def __init__(self, *args, **kwargs):
+        super(DependencyRecordingXmlLoader, self).__init__(*args, **kwargs)
+        self.included_files = set()
+
+    def _include_tag(self, tag, context, *args, **kwargs):
+        try:
+            self.included_files.add(os.path.abspath(self.resolve_args(tag.attributes['file'].value, context)))
+        except Exception:
+            pass  # leave it to the include itself to report the problem.
+        return super(DependencyRecordingXmlLoader, self)._include_tag(tag, context, *args, **kwargs)
+
+
+class LaunchConfigCache(object):
+    '''
+      Parsed wrapper launch configurations for a single rapp, keyed by the
+      wrapper launch text (which captures the namespace and arg values).
+      Entries are discarded when the rapp's launch file, or any launch file
+      it includes, is modified, and the least recently used are dropped
+      beyond max_templates. Remappings vary per start, so are kept out of the
+      key and applied to each copy instead.
+
+      A spare copy of a configuration can be prepared ahead of time (see
+      prepare()), the next get() for it then hands that over without copying.
+    '''
+    __slots__ = ['launch_file', '_templates', '_spares', '_lock']
+
+    max_templates = 8
+
+    def __init__(self, launch_file):
+        '''
+          @param launch_file : fully resolved path to the rapp's launch file
+          @type str
+        '''
+        self.launch_file = launch_file
+        self._templates = collections.OrderedDict()  # launch text : (launch file stamps, roslaunch.config.ROSLaunchConfig), oldest first
+        self._spares = {}  # (launch text, force screen, remaps) : (template it was copied from, roslaunch.config.ROSLaunchConfig)
+        self._lock = threading.Lock()
+
+    def get(self, launch_text, force_screen=False, remap_args=[]):
+        '''
+          Get a fresh launch configuration for the wrapper launch text. The
+          caller is free to modify it.
+
+          @param launch_text : wrapper launch text, see prepare_launch_text
+          @type str
+          @param force_screen : whether to send all node output to screen
+          @type bool
+          @param remap_args : (from, to) remap rules for every node in the launch configuration
+          @type [(str, str)]
+          @return the launch configuration
+          @rtype roslaunch.config.ROSLaunchConfig
+
+          @raise RLException, rospkg.common.ResourceNotFound : if the launch configuration is invalid
+        '''
+        template = self._template(launch_text)
+        with self._lock:
+            spare = self._spares.pop((launch_text, force_screen, tuple(remap_args)), None)
+        if spare is not None and spare[0] is template:
+            return spare[1]
+        return self._copy(template, force_screen, remap_args)
+
+    def prepare(self, launch_text, force_screen=False, remap_args=[]):
+        '''
+          Parse (if necessary) and copy a launch configuration ready for the next get().
+
+          @param launch_text : wrapper launch text, see prepare_launch_text
+          @type str
+          @param force_screen : whether to send all node output to screen
+          @type bool
+          @param remap_args : (from, to) remap rules for every node in the launch configuration
+          @type [(str, str)]
+
+          @raise RLException, rospkg.common.ResourceNotFound : if the launch configuration is invalid
+        '''
+        key = (launch_text, force_screen, tuple(remap_args))
+        template = self._template(launch_text)
+        with self._lock:
+            spare = self._spares.get(key)
+        if spare is None or spare[0] is not template:
+            spare = (template, self._copy(template, force_screen, remap_args))
+            with self._lock:
+                self._spares[key] = spare
+
+    def _template(self, launch_text):
+        with self._lock:
+            cached = self._templates.pop(launch_text, None)
+            if cached is not None:
+                self._templates[launch_text] = cached  # most recently used
+        if cached is None or not stamps_unchanged(cached[0]):
+            loader = DependencyRecordingXmlLoader()
+            # stamp before parsing, a change part way through then triggers a reparse next time
+            stamps = file_stamps([self.launch_file])
+            template = load_config_default([], None, roslaunch_strs=[launch_text], loader=loader, verbose=False)
+            stamps.update(file_stamps(loader.included_files - set(stamps.keys())))
+            with self._lock:
+                self._templates.pop(launch_text, None)
+                self._templates[launch_text] = (stamps, template)
+                while len(self._templates) > self.max_templates:
+                    evicted, unused_cached = self._templates.popitem(last=False)
+                    for key in [key for key in self._spares if key[0] == evicted]:
+                        del self._spares[key]
+        else:
+            template = cached[1]
+        return template
+
+    def _copy(self, template, force_screen, remap_args=[]):
+        # share rather than copy the config's logger (it drags in the logging handlers and
+        # their locks, which can't be copied) and master (read only, so safe to share)
+        memo = dict((id(value), value) for value in vars(template).values() if isinstance(value, logging.Logger))
+        memo[id(template.master)] = template.master
+        config = copy.deepcopy(template, memo)
+        if force_screen:
+            for node in config.nodes:
+                node.output = 'screen'
+        if remap_args:
+            # as if wrapped around the launch file, i.e. a node's own remap for a name takes precedence
+            remap_args = [(canonicalize_name(remap_from), canonicalize_name(remap_to)) for (remap_from, remap_to) in remap_args]
+            for node in config.nodes:
+                own = set(remap[0] for remap in node.remap_args)
+                node.remap_args = [remap for remap in remap_args if remap[0] not in own] + list(node.remap_args)
+        return config
+
+    def clear(self):
+        with self._lock:
+            self._templates = collections.OrderedDict()
+            self._spares = {}
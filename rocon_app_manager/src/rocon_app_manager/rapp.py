@@ -8,17 +8,23 @@
 ##############################################################################
 
 import os
+import copy
 import yaml
 import rospkg
 from roslib.packages import InvalidROSPkgException
 import rospy
 from roslaunch.config import load_config_default
 from roslaunch.core import RLException
-import roslaunch.parent
+import roslaunch.launch
+import roslaunch.pmon
 import traceback
-import tempfile
+import threading
 import rocon_utilities
 from .exceptions import AppException, InvalidRappException
+from .utils import icon_cache
+from .app_list import serialize_msg
+from .launch_config import LaunchConfigCache, DependencyRecordingXmlLoader, file_stamps, stamps_unchanged
+from .latency import span
 import rocon_app_manager_msgs.msg as rapp_manager_msgs
 import rocon_std_msgs.msg as rocon_std_msgs
 
@@ -35,7 +41,7 @@ class PairingClient(object):
     __slots__ = ['client_type', 'manager_data', 'app_data']
 
     def __init__(self, client_type, manager_data, app_data):
-        self.client_type = client_type
+        self.client_type = _intern(client_type)
         self.manager_data = manager_data
         self.app_data = app_data
 
@@ -53,19 +59,113 @@ class PairingClient(object):
         return yaml.dump(self.as_dict())
 
 
+class RappData(object):
+    '''
+      Compact record of a rapp definition. It supports the dict style
+      access (e.g. data['name']) used throughout the app manager. Listing
+      rapps only needs the basics, so the interface and the standard launch
+      args are loaded from their files on first use (and reloaded if those
+      files change).
+    '''
+    __slots__ = ['name', 'display_name', 'description', 'platform', 'launch', 'icon', 'pairing_clients',
+                 'status', 'share', 'interface_file', '_interface', '_launch_args']
+
+    fields = ['name', 'display_name', 'description', 'platform', 'launch', 'launch_args', 'interface',
+              'icon', 'pairing_clients', 'status', 'share']
+
+    def __init__(self, name, display_name, description, platform, launch, interface_file, icon=None, pairing_clients=None):
+        '''
+          @param name : unique identifier for the app, e.g. rocon_apps/chirp.
+          @type str
+          @param launch : full path to the launch file
+          @type str
+          @param interface_file : full path to the interface file
+          @type str
+          @param icon : full path to the icon (if any)
+          @type str
+          @param pairing_clients : pairing client definitions
+          @type [PairingClient]
+        '''
+        self.name = _intern(name)
+        self.display_name = display_name
+        self.description = description
+        self.platform = _intern(platform)
+        self.launch = _intern(launch)
+        self.icon = _intern(icon)
+        self.pairing_clients = pairing_clients if pairing_clients is not None else []
+        self.interface_file = _intern(interface_file)
+        self.status = 'Ready'
+        self.share = 1
+        self._interface = None  # (interface file stamps, interface)
+        self._launch_args = None  # (launch file stamps, standard args)
+
+    @property
+    def interface(self):
+        '''
+          @raise AppException : if the interface file could not be parsed.
+          @raise IOError : if the interface file has gone missing since the rapp was loaded.
+        '''
+        cached = self._interface
+        if cached is None or not stamps_unchanged(cached[0]):
+            stamps = file_stamps([self.interface_file])
+            cached = self._interface = (stamps, load_interface(self.interface_file))
+        return cached[1]
+
+    @property
+    def launch_args(self):
+        '''
+          @raise RLException : if the launch file (or one of its includes) could not be parsed.
+        '''
+        cached = self._launch_args
+        if cached is None or not stamps_unchanged(cached[0]):
+            launch_includes = []
+            stamps = file_stamps([self.launch])
+            launch_args = get_standard_args(self.launch, launch_includes)
+            stamps.update(file_stamps(launch_includes))
+            cached = self._launch_args = (stamps, launch_args)
+        return cached[1]
+
+    def __getstate__(self):
+        return dict((slot, getattr(self, slot)) for slot in RappData.__slots__)
+
+    def __setstate__(self, state):
+        # unpickling (e.g. from the rapp index) doesn't preserve interning
+        for slot, value in state.items():
+            setattr(self, slot, _intern(value) if slot in ['name', 'platform', 'launch', 'icon', 'interface_file', 'status'] else value)
+
+    def __getitem__(self, key):
+        if key not in RappData.fields:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in RappData.fields or key in ['interface', 'launch_args']:
+            raise KeyError(key)
+        setattr(self, key, _intern(value) if key == 'status' else value)
+
+    def __contains__(self, key):
+        return key in RappData.fields
+
+    def __iter__(self):
+        return iter(RappData.fields)
+
+
 class Rapp(object):
     '''
         Got many inspiration and imported from willow_app_manager
         implementation (Jihoon)
     '''
-    # I should add a __slots__ definition here to make it easy to read
-    path = None
-    data = {}
+    __slots__ = ['filename', 'source_files', 'data', 'instances', 'launch_configs', '_msg', '_serialized_msg', '_serialized_msg_without_icon',
+                 '_resolved_connections']
+
+    connection_types = ['publishers', 'subscribers', 'services', 'action_clients', 'action_servers']
+    max_resolved_connections = 32  # distinct (namespace, remappings) to remember per rapp
+
     standard_args = ['gateway_name', 'application_namespace', 'platform_os'
                      'platform_version', 'platform_system', 'platform_type'
                      'platform_name']
 
-    def __init__(self, resource_name, resource_share, rospack=None):
+    def __init__(self, resource_name, resource_share, rospack=None, rapp_index=None, definition=None):
         '''
           @param rospack : a cache to help with repeat calls (optional)
           @type rospkg.RosPack
@@ -73,14 +173,24 @@ class Rapp(object):
           @type str/str
           @param resource_share : how many can share this app.
           @type uint16
+          @param rapp_index : compiled rapp definitions to load from/save to (optional)
+          @type rapp_index.RappIndex
+          @param definition : (filename, data, source files) already parsed elsewhere, e.g. by a loader process (optional)
+          @type (str, RappData, [str])
         '''
         self.filename = ""
-        self._connections = {}
-        for connection_type in ['publishers', 'subscribers', 'services', 'action_clients', 'action_servers']:
-            self._connections[connection_type] = []
-
-        self._load_from_resource_name(resource_name, rospack=rospack)
+        self.data = None
+        self.source_files = []  # files the rapp definition was parsed from
+        self._msg = None  # cached to_msg() result, rebuilt on status or definition changes
+        self._serialized_msg = (None, None)  # (msg, serialized msg) cache for to_serialized_msg()
+        self._serialized_msg_without_icon = (None, None, None)  # (msg, msg without icon, serialized msg) cache for to_serialized_msg(False)
+        self.instances = []  # running instances of this rapp
+        self.launch_configs = None  # parsed launch configurations, see LaunchConfigCache
+        self._resolved_connections = {}  # (namespace, remappings) : (interface, remap rules, connections), see resolve_connections()
+
+        self._load_from_resource_name(resource_name, rospack=rospack, rapp_index=rapp_index, definition=definition)
         self.data['share'] = resource_share
+        self.launch_configs = LaunchConfigCache(self.data['launch'])
 
     def __repr__(self):
         string = ""
@@ -88,21 +198,40 @@ class Rapp(object):
             string += d + " : " + str(self.data[d]) + "\n"
         return string
 
-    def _load_from_resource_name(self, name, rospack=None):
+    def _load_from_resource_name(self, name, rospack=None, rapp_index=None, definition=None):
         '''
           Loads from a ros resource name consisting of a package/app pair.
+          If an up to date entry exists in the rapp index, it is used instead
+          of parsing the rapp files.
 
           @param name : unique identifier for the app, e.g. rocon_apps/chirp.
           @type str
           @param rospack : a cache to help with repeat calls (optional)
           @type rospkg.RosPack
+          @param rapp_index : compiled rapp definitions (optional)
+          @type rapp_index.RappIndex
+          @param definition : (filename, data, source files) already parsed (or looked up in the index) elsewhere (optional)
+          @type (str, RappData, [str])
 
           @raise InvalidRappException if the app definition was for some reason invalid.
         '''
         if not name:
             raise InvalidRappException("app name was invalid [%s]" % name)
-        self.filename = rocon_utilities.find_resource_from_string(name + '.rapp', rospack=rospack)
-        self._load_from_app_file(self.filename, name, rospack=rospack)
+        if definition is None and rapp_index is not None:
+            indexed = rapp_index.lookup(name)
+            if indexed is not None:
+                rospy.logdebug("App Manager : loading app '%s' from the rapp index" % name)
+                self.filename, self.data, self.source_files = indexed
+                self._msg = None
+                return
+        if definition is not None:
+            self.filename, self.data, self.source_files = definition
+            self._msg = None
+        else:
+            self.filename = rocon_utilities.find_resource_from_string(name + '.rapp', rospack=rospack)
+            self._load_from_app_file(self.filename, name, rospack=rospack)
+        if rapp_index is not None:
+            rapp_index.update(name, self.filename, self.data, self.source_files)
 
     def _load_from_app_file(self, path, app_name, rospack=None):
         '''
@@ -115,37 +244,46 @@ class Rapp(object):
         '''
         rospy.loginfo("App Manager : loading app '%s'" % app_name)  # str(path)
         self.filename = path
+        self.source_files = [path]
 
         with open(path, 'r') as f:
-            data = {}
             app_data = yaml.load(f.read())
 
             for reqd in ['launch', 'interface', 'platform']:
                 if not reqd in app_data:
                     raise AppException("Invalid appfile format [" + path + "], missing required key [" + reqd + "]")
 
-            data['name'] = app_name
-            data['display_name'] = app_data.get('display', app_name)
-            data['description'] = app_data.get('description', '')
-            data['platform'] = app_data['platform']
-            data['launch'] = self._find_rapp_resource(app_data['launch'], 'launch', app_name, rospack=rospack)
-            data['launch_args'] = get_standard_args(data['launch'])
-            #rospy.loginfo("App Manager : application requests the following standard arguments " + str(data['launch_args']))
-            data['interface'] = self._load_interface(self._find_rapp_resource(app_data['interface'], 'interface', app_name, rospack=rospack))
-            data['pairing_clients'] = []
-            data['pairing_clients'] = self._load_pairing_clients(app_data, path)
+            # the interface and launch args are loaded on demand (see RappData), but their files are found up front
+            launch = find_rapp_resource(app_data['launch'], 'launch', app_name, rospack=rospack)
+            self.source_files.append(launch)
+            interface = find_rapp_resource(app_data['interface'], 'interface', app_name, rospack=rospack)
+            self.source_files.append(interface)
             if 'icon' not in app_data:
-                data['icon'] = None
+                icon = None
             else:
-                data['icon'] = self._find_rapp_resource(app_data['icon'], 'icon', app_name, rospack=rospack)
-            data['status'] = 'Ready'
+                icon = find_rapp_resource(app_data['icon'], 'icon', app_name, rospack=rospack)
+                self.source_files.append(icon)
+            data = RappData(app_name,
+                            app_data.get('display', app_name),
+                            app_data.get('description', ''),
+                            app_data['platform'],
+                            launch,
+                            interface,
+                            icon,
+                            self._load_pairing_clients(app_data, path))
 
         self.data = data
+        self._msg = None
 
     def to_msg(self):
         '''
-          Converts this app definition to ros msg format.
+          Converts this app definition to ros msg format. The message is
+          cached and only rebuilt when the status or share changes, so it must
+          not be modified by the caller.
         '''
+        a = self._msg
+        if a is not None and a.status == self.data['status'] and a.share == self.data['share']:
+            return a
         a = rapp_manager_msgs.App()
         a.name = self.data['name']
         a.display_name = self.data['display_name']
@@ -153,63 +291,100 @@ class Rapp(object):
         a.platform = self.data['platform']
         a.status = self.data['status']
         a.share = self.data['share']
-        a.icon = rocon_utilities.icon_to_msg(self.data['icon'])
+        a.icon = icon_cache.icon_to_msg(self.data['icon'])
         for pairing_client in self.data['pairing_clients']:
             a.pairing_clients.append(PairingClient(pairing_client.client_type,
                                        dict_to_KeyValue(pairing_client.manager_data),
                                        dict_to_KeyValue(pairing_client.app_data)))
+        self._msg = a
         return a
 
-    def _find_rapp_resource(self, resource, log, app_name="Unknown", rospack=None):
+    def to_serialized_msg(self, include_icon=True):
         '''
-          A simple wrapper around rocon_utilities.find_resource_from_string to locate rapp resources.
+          Converts this app definition to ros msg format along with its
+          serialization. Both are cached along with to_msg().
 
-          @param resource is a ros resource (package/name)
-          @type str
-          @param log : string used for log messages when something goes wrong (e.g. 'icon')
-          @type str
-          @param name : app name, also only used for logging purposes
-          @return full path to the resource
+          @param include_icon : if false, the icon is left empty (for clients on slow links)
+          @type bool
+          @return (msg, serialized msg)
+          @rtype (rapp_manager_msgs.App, str)
+        '''
+        msg = self.to_msg()
+        if not include_icon:
+            if self._serialized_msg_without_icon[0] is not msg:
+                stripped = copy.copy(msg)
+                stripped.icon = rocon_std_msgs.Icon()
+                self._serialized_msg_without_icon = (msg, stripped, serialize_msg(stripped))
+            return self._serialized_msg_without_icon[1:]
+        if self._serialized_msg[0] is not msg:
+            self._serialized_msg = (msg, serialize_msg(msg))
+        return self._serialized_msg
+
+    def prepare_standby(self, application_namespace, gateway_name, platform_info, remappings=[], force_screen=False):
+        '''
+          Do everything for the next start that doesn't depend on the start request itself
+          (given the remappings it is expected to bring): load the lazily loaded parts of the
+          definition, resolve the connections and parse and copy the launch configuration.
+          Arguments are as for RappInstance.start().
+
+          @raise RLException, rospkg.common.ResourceNotFound : if the launch configuration is invalid
+        '''
+        remap_args, unused_connections = self.resolve_connections(application_namespace, remappings)
+        launch_text = prepare_launch_text(self.data['launch'], self.data['launch_args'], application_namespace,
+                                          gateway_name, platform_info)
+        self.launch_configs.prepare(launch_text, force_screen, remap_args)
+        self.to_serialized_msg()
+
+    def resolve_connections(self, application_namespace, remappings=[]):
+        '''
+          Work out the names of the rapp's interface connections when launched underneath
+          the application namespace with the requested remappings. Results are cached
+          per (namespace, remappings), concert solutions tend to send the same ones
+          every time.
+
+          @param application_namespace : namespace the rapp is launched under
           @type str
-          @param rospack : a cache to help with repeat calls (optional)
-          @type rospkg.RosPack
-          @raise AppException: if resource does not exist or something else went wrong.
+          @param remappings : rules for the app flips (the first rule for a name wins)
+          @type list of rocon_std_msgs.msg.Remapping values.
+          @return remap rules to launch with, connection names (for flipping) keyed by connection type
+          @rtype ([(str, str)], { str : [str] })
         '''
-        try:
-            path_to_resource = rocon_utilities.find_resource_from_string(resource, rospack=rospack)
-            if not os.path.exists(path_to_resource):
-                raise AppException("invalid appfile [%s]: %s file does not exist." % (app_name, log))
-            return path_to_resource
-        except ValueError as e:
-            raise AppException("invalid appfile [%s]: bad %s entry: %s" % (app_name, log, e))
-            """
-        except NotFoundException:
-            raise AppException("App file [%s] refers to %s which is not installed"%(app_name,log))
-            """
-        except InvalidROSPkgException as e:
-            raise AppException("App file [%s] refers to %s which is not installed: %s" % (app_name, log, str(e)))
-
-    def _load_interface(self, data):
-        d = {}
-        keys = ['subscribers', 'publishers', 'services', 'action_clients', 'action_servers']
-        with open(data, 'r') as f:
-            y = yaml.load(f.read())
-            y = y or {}
-            try:
-                for k in keys:
-                    raw_data = y.get(k, [])
-
-                    new_data = []
-                    for r in raw_data:
-                        #if r[0] == '/':  # originally removed these, but we really do need to reference such sometimes
-                        #    r = r[1:len(r)]
-                        new_data.append(r)
-                    d[k] = new_data
-
-            except KeyError:
-                raise AppException("Invalid interface, missing keys")
-
-        return d
+        remap_table = {}
+        for remapping in remappings:
+            remap_table.setdefault(remapping.remap_from, remapping.remap_to)
+        interface = self.data['interface']
+        key = (application_namespace, frozenset(remap_table.items()))
+        cached = self._resolved_connections.get(key)
+        if cached is None or cached[0] is not interface:
+            remap_args = []
+            connections = {}
+            for connection_type in Rapp.connection_types:
+                connections[connection_type] = []
+                for t in interface[connection_type]:
+                    remap_to = remap_table.get(t)
+                    if remap_to is not None:
+                        if rocon_utilities.ros.is_absolute_name(remap_to):
+                            remapped_name = remap_to
+                        else:
+                            remapped_name = '/' + application_namespace + "/" + remap_to
+                        if (t, remapped_name) not in remap_args:
+                            remap_args.append((t, remapped_name))
+                        connections[connection_type].append(remapped_name)
+                    else:
+                        # don't pass these in as remapping rules - they should map fine for the node as is
+                        # just by getting pushed down the namespace.
+                        #     https://github.com/robotics-in-concert/rocon_app_platform/issues/61
+                        # we still need to pass them back to register for flipping though.
+                        if rocon_utilities.ros.is_absolute_name(t):
+                            flipped_name = t
+                        else:
+                            flipped_name = '/' + application_namespace + '/' + t
+                        connections[connection_type].append(flipped_name)
+            if len(self._resolved_connections) >= Rapp.max_resolved_connections:
+                self._resolved_connections = {}
+            cached = (interface, remap_args, connections)
+            self._resolved_connections[key] = cached
+        return list(cached[1]), dict((connection_type, list(names)) for (connection_type, names) in cached[2].items())
 
     def _load_pairing_clients(self, app_data, appfile="UNKNOWN"):
         '''
@@ -235,19 +410,64 @@ class Rapp(object):
             clients.append(PairingClient(client_type, manager_data, app_data))
         return clients
 
-    def start(self, application_namespace, gateway_name, platform_info, remappings=[], force_screen=False):
+
+class RappInstance(object):
+    '''
+      A launched instance of a rapp. Several instances of a rapp may run
+      concurrently (up to its share), each underneath its own namespace.
+    '''
+    __slots__ = ['rapp', 'name', 'namespace', 'remote_name', 'flip_lock', '_process_monitor', '_processes', '_required_processes',
+                 '_connections', '_exit_callback', '_dead_processes', '_finished', '_launching', '_cancelled',
+                 '_launch_condition']
+
+    def __init__(self, rapp, name, namespace, exit_callback=None, process_monitor=None):
+        '''
+          @param rapp : the rapp definition to launch.
+          @type Rapp
+          @param name : unique name for this instance, e.g. chirp or chirp_2.
+          @type str
+          @param namespace : unique name granted indirectly via the gateways, we namespace everything under this
+          @type str
+          @param exit_callback : called (in its own thread) with this instance when all its processes have exited.
+          @type method
+          @param process_monitor : process monitor shared with other rapp instances (a private one is created if None)
+          @type RappProcessMonitor
+        '''
+        self.rapp = rapp
+        self.name = name
+        self.namespace = namespace
+        self.remote_name = None  # remote gateway its connections are flipped to (managed by the rapp manager)
+        self.flip_lock = threading.Lock()  # serialises (un)flips of its connections (managed by the rapp manager)
+        self._process_monitor = process_monitor if process_monitor is not None else RappProcessMonitor()
+        self._processes = None  # names of the launched processes, None if not launched
+        self._required_processes = set()
+        self._exit_callback = exit_callback
+        self._dead_processes = set()
+        self._finished = False
+        self._launching = False  # start() is launching the processes
+        self._cancelled = False  # stopped before start() got its processes launched
+        self._launch_condition = threading.Condition()
+        self._connections = {}
+        for connection_type in ['publishers', 'subscribers', 'services', 'action_clients', 'action_servers']:
+            self._connections[connection_type] = []
+
+    def to_serialized_msg(self, include_icon=True):
+        return self.rapp.to_serialized_msg(include_icon)
+
+    def to_msg(self):
+        return self.rapp.to_msg()
+
+    def start(self, gateway_name, platform_info, remappings=[], force_screen=False, latency=None):
         '''
           Some important jobs here.
 
-          1) run the rapp launcher under the unique robot name namespace
+          1) run the rapp launcher under this instance's namespace
 
           This guarantees that flipped entities generate unique node id's that won't collide when communicating
           with each other (refer to https://github.com/robotics-in-concert/rocon_multimaster/issues/136).
 
           2) Apply remapping rules while ignoring the namespace underneath.
 
-          @param application_namespace ; unique name granted indirectly via the gateways, we namespace everything under this
-          @type str
           @param gateway_name ; unique name granted to the gateway
           @type str
           @param platform_info ; unique name granted to the gateway
@@ -256,94 +476,140 @@ class Rapp(object):
           @type list of rocon_std_msgs.msg.Remapping values.
           @param force_screen : whether to roslaunch the app with --screen or not
           @type boolean
+          @param latency : records the time taken by each phase of the start
+          @type LatencyTracker
         '''
-        data = self.data
+        data = self.rapp.data
+        application_namespace = self.namespace
+        with self._launch_condition:
+            if self._cancelled:
+                rospy.loginfo("App Manager : stopped before launching [%s]" % self.name)
+                return False, "stopped before launching " + data['name'], [], [], [], [], []
+            self._launching = True
         rospy.loginfo("App Manager : launching: " + (data['name']) + " underneath /" + application_namespace)
 
         # Starts rapp
         try:
-            temp = tempfile.NamedTemporaryFile(mode='w+t', delete=False)
-            launch_text = prepare_launch_text(data['launch'], 
-                    data['launch_args'], application_namespace, gateway_name,
-                    platform_info)
-            temp.write(launch_text)
-            temp.close()  # unlink it later
-
-            # Create roslaunch
-            self._launch = roslaunch.parent.ROSLaunchParent(rospy.get_param("/run_id"),
-                                                            [temp.name],
-                                                            is_core=False,
-                                                            process_listeners=(),
-                                                            force_screen=force_screen)
-            self._launch._load_config()
-
-            #print data['interface']
-            self._connections = {}
-
-            # Prefix with robot name by default (later pass in remap argument)
-            remap_from_list = [remapping.remap_from for remapping in remappings]
-            remap_to_list = [remapping.remap_to for remapping in remappings]
-            for connection_type in ['publishers', 'subscribers', 'services', 'action_clients', 'action_servers']:
-                self._connections[connection_type] = []
-                for t in data['interface'][connection_type]:
-                    remapped_name = None
-                    # Now we push the rapp launcher down into the prefixed
-                    # namespace, so just use it directly
-                    indices = [i for i, x in enumerate(remap_from_list) if x == t]
-                    if indices:
-                        if rocon_utilities.ros.is_absolute_name(remap_to_list[indices[0]]):
-                            remapped_name = remap_to_list[indices[0]]
-                        else:
-                            remapped_name = '/' + application_namespace + "/" + remap_to_list[indices[0]]
-                        for N in self._launch.config.nodes:
-                            N.remap_args.append((t, remapped_name))
-                        self._connections[connection_type].append(remapped_name)
-                    else:
-                        # don't pass these in as remapping rules - they should map fine for the node as is
-                        # just by getting pushed down the namespace.
-                        #     https://github.com/robotics-in-concert/rocon_app_platform/issues/61
-                        # we still need to pass them back to register for flipping though.
-                        if rocon_utilities.ros.is_absolute_name(t):
-                            flipped_name = t
-                        else:
-                            flipped_name = '/' + application_namespace + '/' + t
-                        self._connections[connection_type].append(flipped_name)
-            self._launch.start()
-
-            data['status'] = 'Running'
+            with span(latency, 'start_app', 'remaps', data['name']):
+                # Remaps are applied once, around the rapp's launcher (i.e. to all its nodes)
+                remap_args, self._connections = self.rapp.resolve_connections(application_namespace, remappings)
+
+            with span(latency, 'start_app', 'launch_text', data['name']):
+                launch_text = prepare_launch_text(data['launch'],
+                        data['launch_args'], application_namespace, gateway_name,
+                        platform_info)
+
+            # The (parsed, in memory) launch configuration, cached per launch text, remapped per start
+            with span(latency, 'start_app', 'load_config', data['name']):
+                config = self.rapp.launch_configs.get(launch_text, force_screen, remap_args)
+
+            with span(latency, 'start_app', 'launch', data['name']):
+                self._dead_processes = set()
+                self._finished = False
+                self._processes, self._required_processes = self._process_monitor.launch(self, config)
+                # catch anything that exited before we knew its name
+                active = self._process_monitor.active_names()
+                for process_name in self._processes:
+                    if process_name not in active and process_name not in self._dead_processes:
+                        self._process_died(process_name, None)
+
+            with self._launch_condition:
+                cancelled = self._cancelled
+            if cancelled:
+                # stop() is waiting on us, don't leave it anything to kill
+                rospy.loginfo("App Manager : stopped while launching [%s]" % self.name)
+                try:
+                    self._process_monitor.kill(self._processes)
+                finally:
+                    self._processes = None
+                return False, "stopped while launching " + data['name'], [], [], [], [], []
+            self.rapp.instances.append(self)
+            self._update_status()
             return True, "Success", self._connections['subscribers'], self._connections['publishers'], self._connections['services'], self._connections['action_clients'], self._connections['action_servers']
 
         except Exception as e:
             print str(e)
             traceback.print_stack()
             rospy.loginfo("Error While launching " + data['launch'])
-            data['status'] = "Error While launching " + data['launch']
+            self._update_status("Error While launching " + data['launch'])
             return False, "Error while launching " + data['name'], [], [], [], [], []
         finally:
-            os.unlink(temp.name)
-
-    def stop(self):
-        data = self.data
+            with self._launch_condition:
+                self._launching = False
+                self._launch_condition.notify_all()
 
+    def stop(self, latency=None):
+        '''
+          @param latency : records the time taken to shut the rapp down
+          @type LatencyTracker
+        '''
+        data = self.rapp.data
+
+        with self._launch_condition:
+            if self._processes is None:
+                self._cancelled = True  # a start that is yet to launch gives up
+            # let a start that is part way through launch first, so nothing it launches is left untracked
+            while self._launching:
+                self._launch_condition.wait()
         try:
-            if self._launch:
+            if self._processes is not None:
                 try:
-                    self._launch.shutdown()
+                    with span(latency, 'stop_app', 'shutdown', data['name']):
+                        self._process_monitor.kill(self._processes)
                 finally:
-                    self._launch = None
-                    data['status'] = 'Ready'
+                    self._processes = None
+                    if self in self.rapp.instances:
+                        self.rapp.instances.remove(self)
+                    self._update_status()
                 rospy.loginfo("App Manager : stopped app [%s]" % data['name'])
         except Exception as e:
             print str(e)
             rospy.loginfo("Error while stopping " + data['name'])
-            data['status'] = 'Error'
+            self._update_status('Error')
             return False, "Error while stopping " + data['name'], self._connections['subscribers'], self._connections['publishers'], self._connections['services'], self._connections['action_clients'], self._connections['action_servers']
 
         return True, "Success", self._connections['subscribers'], self._connections['publishers'], self._connections['services'], self._connections['action_clients'], self._connections['action_servers']
 
+    def _update_status(self, error=None):
+        '''
+          The status is shared by every instance of the rapp: it is running while any
+          instance is, otherwise ready (or the error, if there was one).
+
+          @param error : status to show if no instances are left running
+          @type str
+        '''
+        if self.rapp.instances:
+            self.rapp.data['status'] = 'Running'
+        else:
+            self.rapp.data['status'] = error if error is not None else 'Ready'
+
+    def _process_died(self, process_name, exit_code):
+        '''
+          Process monitor callback for one of this instance's processes exiting. Once
+          none are left (or a required node died), the instance has finished by itself.
+        '''
+        processes = self._processes
+        if processes is None or self._finished:
+            return
+        process = self._process_monitor.get_process(process_name)
+        if process is not None and getattr(process, 'respawn', False):
+            return  # it'll be back
+        self._dead_processes.add(process_name)
+        if process_name in self._required_processes or not (set(processes) - self._dead_processes):
+            self._finished = True
+            if process_name in self._required_processes:
+                rospy.loginfo("App Manager : required process died, rapp finished [%s][%s]" % (self.name, process_name))
+            else:
+                rospy.loginfo("App Manager : rapp finished [%s]" % self.name)
+            if self._exit_callback is not None:
+                # don't tie up (or try to shut down from) the process monitor's own thread
+                thread = threading.Thread(target=self._exit_callback, args=(self,))
+                thread.daemon = True
+                thread.start()
+
     def is_running(self):
         '''
-         Is the rapp both launched and currently running?
+         Is the rapp instance both launched and currently running?
 
          Actually three possible states 1) not launched 2) running, 3) stopped
          Could acutally return a tertiary value, but rapp manager doesn't need
@@ -355,17 +621,198 @@ class Rapp(object):
          @return True if the rapp is executing or False otherwise.
          @type Bool
         '''
-        if not self._launch:
+        if self._processes is None:
             return False
-        elif self._launch.pm and self._launch.pm.done:
-            # time.sleep(1.0)  # do we need this sleep?
-            return False
-        return True
+        return not self._finished
+
+
+class RappProcessMonitor(roslaunch.pmon.ProcessListener):
+    '''
+      One process monitor shared by every rapp instance, rather than a
+      roslaunch parent (with its own monitor thread and xmlrpc server) per
+      start. Instances launch their nodes into it and kill just their own
+      processes when stopping. Process exits are relayed to the instance
+      that owns the process.
+
+      Required nodes are tracked here rather than by the process monitor,
+      which would otherwise shut down every rapp when one died.
+    '''
+    def __init__(self):
+        self._pm = None  # started on first use
+        self._owners = {}  # process name : RappInstance
+        self._lock = threading.Lock()
+
+    def launch(self, instance, config):
+        '''
+          Launch the nodes of a launch configuration (local machine only).
+
+          @param instance : the rapp instance the nodes belong to
+          @type RappInstance
+          @param config : launch configuration, its nodes are modified
+          @type roslaunch.config.ROSLaunchConfig
+          @return names of the launched processes and those of them that are required
+          @rtype ([str], set of str)
+
+          @raise RLException : if the launch failed
+        '''
+        with self._lock:
+            if self._pm is None or self._pm.is_shutdown:
+                self._pm = roslaunch.pmon.start_process_monitor()
+                self._pm.add_process_listener(self)
+            pm = self._pm
+        required_nodes = [node for node in config.nodes if node.required]
+        for node in required_nodes:
+            node.required = False
+
+        def register(process_name):
+            with self._lock:
+                self._owners[process_name] = instance
+        runner = _RappLaunchRunner(rospy.get_param("/run_id"), config, pm, required_nodes, register)
+        try:
+            unused_succeeded, failed = runner.launch()
+        except Exception:
+            self.kill([name for (name, unused_required) in runner.processes])
+            raise
+        finally:
+            runner.remove_process_listener()
+        if failed:
+            rospy.logwarn("App Manager : failed to launch some nodes [%s][%s]" % (instance.name, failed))
+        return [name for (name, unused_required) in runner.processes], set(name for (name, required) in runner.processes if required)
+
+    def kill(self, process_names):
+        '''
+          Stop processes (in parallel). Their exits aren't relayed and they aren't respawned.
+
+          @param process_names : names as returned by launch()
+          @type [str]
+        '''
+        with self._lock:
+            pm = self._pm
+            for name in process_names:
+                self._owners.pop(name, None)
+        if pm is None:
+            return
+        processes = [p for p in [pm.get_process(name) for name in process_names] if p is not None]
+        for process in processes:
+            pm.unregister(process)
+        threads = [threading.Thread(target=process.stop, args=([],)) for process in processes]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def get_process(self, process_name):
+        pm = self._pm
+        return pm.get_process(process_name) if pm is not None else None
+
+    def active_names(self):
+        pm = self._pm
+        return set(pm.get_active_names()) if pm is not None else set()
+
+    def process_died(self, process_name, exit_code):
+        instance = self._owners.get(process_name)
+        if instance is not None:
+            instance._process_died(process_name, exit_code)
+
+
+class _RappLaunchRunner(roslaunch.launch.ROSLaunchRunner):
+    '''
+      Launches into a shared process monitor, recording the processes it
+      creates (and registering their owner as soon as they exist).
+    '''
+    def __init__(self, run_id, config, pm, required_nodes, process_callback):
+        '''
+          @param required_nodes : nodes to flag as required in the recorded processes
+          @type [roslaunch.core.Node]
+          @param process_callback : called with the name of each process as it is created
+          @type method
+        '''
+        super(_RappLaunchRunner, self).__init__(run_id, config, pmon=pm, is_core=False)
+        self.processes = []  # (process name, required)
+        self._required_nodes = required_nodes
+        self._process_callback = process_callback
+
+    def launch_node(self, node, *args, **kwargs):
+        process, success = super(_RappLaunchRunner, self).launch_node(node, *args, **kwargs)
+        # it's the node name if the process couldn't be created, processes that failed to start are still registered
+        if isinstance(process, roslaunch.pmon.Process):
+            self.processes.append((process.name, any(node is n for n in self._required_nodes)))
+            self._process_callback(process.name)
+        return process, success
+
+    def remove_process_listener(self):
+        '''
+          The runner adds its own listener to the process monitor, but the monitor
+          is shared and outlives it, so it must be removed after launching.
+        '''
+        try:
+            self.pm.listeners.remove(self.listeners)
+        except ValueError:
+            pass  # already gone
 
 ##############################################################################
 # Utilities
 ##############################################################################
 
+def _intern(value):
+    '''
+      Intern strings (e.g. platform, paths) that are repeated across many rapps.
+    '''
+    return intern(value) if isinstance(value, str) else value
+
+
+def find_rapp_resource(resource, log, app_name="Unknown", rospack=None):
+    '''
+      A simple wrapper around rocon_utilities.find_resource_from_string to locate rapp resources.
+
+      @param resource is a ros resource (package/name)
+      @type str
+      @param log : string used for log messages when something goes wrong (e.g. 'icon')
+      @type str
+      @param name : app name, also only used for logging purposes
+      @return full path to the resource
+      @type str
+      @param rospack : a cache to help with repeat calls (optional)
+      @type rospkg.RosPack
+      @raise AppException: if resource does not exist or something else went wrong.
+    '''
+    try:
+        path_to_resource = rocon_utilities.find_resource_from_string(resource, rospack=rospack)
+        if not os.path.exists(path_to_resource):
+            raise AppException("invalid appfile [%s]: %s file does not exist." % (app_name, log))
+        return path_to_resource
+    except ValueError as e:
+        raise AppException("invalid appfile [%s]: bad %s entry: %s" % (app_name, log, e))
+        """
+    except NotFoundException:
+        raise AppException("App file [%s] refers to %s which is not installed"%(app_name,log))
+        """
+    except InvalidROSPkgException as e:
+        raise AppException("App file [%s] refers to %s which is not installed: %s" % (app_name, log, str(e)))
+
+
+def load_interface(data):
+    d = {}
+    keys = ['subscribers', 'publishers', 'services', 'action_clients', 'action_servers']
+    with open(data, 'r') as f:
+        y = yaml.load(f.read())
+        y = y or {}
+        try:
+            for k in keys:
+                raw_data = y.get(k, [])
+
+                new_data = []
+                for r in raw_data:
+                    #if r[0] == '/':  # originally removed these, but we really do need to reference such sometimes
+                    #    r = r[1:len(r)]
+                    new_data.append(r)
+                d[k] = new_data
+
+        except KeyError:
+            raise AppException("Invalid interface, missing keys")
+
+    return d
+
 
 def dict_to_KeyValue(d):
     '''
@@ -377,7 +824,7 @@ def dict_to_KeyValue(d):
     return l
 
 
-def get_standard_args(roslaunch_file):
+def get_standard_args(roslaunch_file, included_files=None):
     '''
       Given the Rapp launch file, this function parses the top-level args
       in the file. Returns the complete list of top-level arguments that
@@ -385,16 +832,21 @@ def get_standard_args(roslaunch_file):
 
       @param roslaunch_file : rapp launch file we are parsing for arguments
       @type str
+      @param included_files : if provided, gets extended with the launch files
+             that the rapp launch file includes (on successful parses only)
+      @type list
       @return list of top-level arguments that match standard arguments. Empty
               list on parse failure
       @rtype [str]
     '''
     try:
-        loader = roslaunch.xmlloader.XmlLoader(resolve_anon=False)
+        loader = DependencyRecordingXmlLoader(resolve_anon=False)
         unused_config = load_config_default([roslaunch_file], None, loader=loader,
                                      verbose=False, assign_machines=False)
         available_args = \
                 [str(x) for x in loader.root_context.resolve_dict['arg']]
+        if included_files is not None:
+            included_files.extend(sorted(loader.included_files))
         return [x for x in available_args if x in Rapp.standard_args]
     except (RLException, rospkg.common.ResourceNotFound) as e:
         # The ResourceNotFound lets us catch errors when the launcher has invalid
@@ -433,7 +885,8 @@ def prepare_launch_text(launch_file, launch_args, application_namespace,
     launch_arg_mapping['platform_type'] = platform_info.platform
     launch_arg_mapping['platform_name'] = platform_info.name
 
-    launch_text = '<launch>\n  <include ns="%s" file="%s">\n' % (application_namespace, launch_file)
+    launch_text = '<launch>\n'
+    launch_text += '  <include ns="%s" file="%s">\n' % (application_namespace, launch_file)
     for arg in launch_args:
         launch_text += '    <arg name="%s" value="%s"/>' % (arg, launch_arg_mapping[arg])
     launch_text += '  </include>\n</launch>\n'
@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+#
+# License: BSD
+#   https://raw.github.com/robotics-in-concert/rocon_app_platform/master/rocon_app_manager/LICENSE
+#
+##############################################################################
+# Overview
+##############################################################################
+'''
+ A persistent, compiled index of rapp definitions. Parsing every .rapp,
+ .interface and launch file on each boot is expensive for large catalogs,
+ so the parsed results are stored on disk alongside stamps of the source
+ files they came from. Only rapps whose sources changed get re-parsed.
+'''
+##############################################################################
+# Imports
+##############################################################################
+
+import os
+import copy
+import hashlib
+import tempfile
+import cPickle as pickle
+import rospkg
+import rospy
+
+##############################################################################
+# Methods
+##############################################################################
+
+
+def default_index_path():
+    '''
+      @return the default location of the rapp index (in the ros home directory).
+      @rtype str
+    '''
+    return os.path.join(rospkg.get_ros_home(), 'rocon', 'app_manager', 'rapp_index.pickle')
+
+
+def _file_digest(filename):
+    sha1 = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        sha1.update(f.read())
+    return sha1.hexdigest()
+
+
+def _file_stamp(filename):
+    '''
+      @return (mtime, size, sha1) triple for the file.
+      @raise OSError, IOError if the file is not accessible.
+    '''
+    s = os.stat(filename)
+    return (s.st_mtime, s.st_size, _file_digest(filename))
+
+##############################################################################
+# Class
+##############################################################################
+
+
+class RappIndex(object):
+    '''
+      Compiled rapp definitions keyed by resource name (e.g. rocon_apps/chirp).
+
+      Each entry stores the parsed rapp data along with the (mtime, size, sha1)
+      stamps of every source file that went into it. An entry is only reused
+      if all of its sources are unchanged - mtime and size are checked first,
+      the content hash only when those differ (e.g. after a reinstall).
+
+      The whole index is invalidated if the ROS_PACKAGE_PATH changes since
+      resource names may then resolve to entirely different files.
+    '''
+    __slots__ = ['filename', '_entries', '_used', '_dirty']
+
+    version = 3
+
+    def __init__(self, filename):
+        '''
+          @param filename : file path to the index (need not exist yet).
+          @type str
+        '''
+        self.filename = filename
+        self._entries = {}
+        self._used = set()
+        self._dirty = False
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.filename, 'rb') as f:
+                index = pickle.load(f)
+        except (IOError, OSError):
+            return  # no index yet, start from scratch.
+        except Exception as e:  # corrupt or from an incompatible release
+            rospy.logwarn("App Manager : ignoring invalid rapp index [%s][%s]" % (self.filename, str(e)))
+            return
+        if not isinstance(index, dict) or \
+           index.get('version') != RappIndex.version or \
+           index.get('ros_package_path') != os.environ.get('ROS_PACKAGE_PATH'):
+            rospy.loginfo("App Manager : rapp index is out of date, rebuilding [%s]" % self.filename)
+            self._dirty = True
+            return
+        self._entries = index['entries']
+
+    def lookup(self, resource_name):
+        '''
+          Retrieve the compiled rapp data if it is still up to date.
+
+          @param resource_name : package/name pair for the rapp.
+          @type str
+          @return (filename, data, source files) tuple or None if missing or stale.
+          @rtype (str, rapp.RappData, [str]) or None
+        '''
+        entry = self._entries.get(resource_name)
+        if entry is None:
+            return None
+        for source, stamp in entry['sources'].items():
+            try:
+                s = os.stat(source)
+                if (s.st_mtime, s.st_size) == stamp[:2]:
+                    continue
+                if s.st_size == stamp[1] and _file_digest(source) == stamp[2]:
+                    entry['sources'][source] = (s.st_mtime, s.st_size, stamp[2])  # touched, not modified
+                    self._dirty = True
+                    continue
+            except (IOError, OSError):
+                pass
+            return None
+        self._used.add(resource_name)
+        data = copy.deepcopy(entry['data'])
+        data['status'] = 'Ready'
+        return entry['filename'], data, entry['sources'].keys()
+
+    def update(self, resource_name, filename, data, sources):
+        '''
+          Store freshly parsed rapp data in the index.
+
+          @param resource_name : package/name pair for the rapp.
+          @type str
+          @param filename : full path to the .rapp file.
+          @type str
+          @param data : parsed rapp data.
+          @type rapp.RappData
+          @param sources : paths of all the files the data was parsed from.
+          @type [str]
+        '''
+        try:
+            stamps = dict((source, _file_stamp(source)) for source in sources)
+        except (IOError, OSError) as e:
+            rospy.logwarn("App Manager : not indexing rapp '%s' [%s]" % (resource_name, str(e)))
+            return
+        data = copy.deepcopy(data)
+        data['status'] = None  # runtime state, not part of the definition
+        data['share'] = None
+        self._entries[resource_name] = {'filename': filename, 'sources': stamps, 'data': data}
+        self._used.add(resource_name)
+        self._dirty = True
+
+    def save(self, prune=False):
+        '''
+          Write the index back to disk if it changed. The write is atomic
+          so concurrently starting managers never see a partial index.
+
+          @param prune : drop entries that were not looked up or updated
+                         since this index was loaded.
+          @type bool
+          @return True if the index was saved successfully (or was unchanged).
+          @rtype bool
+        '''
+        if prune:
+            for resource_name in set(self._entries.keys()) - self._used:
+                del self._entries[resource_name]
+                self._dirty = True
+        if not self._dirty:
+            return True
+        index = {'version': RappIndex.version,
+                 'ros_package_path': os.environ.get('ROS_PACKAGE_PATH'),
+                 'entries': self._entries}
+        directory = os.path.dirname(self.filename)
+        try:
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            (fd, temp_filename) = tempfile.mkstemp(dir=directory or None, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(index, f, pickle.HIGHEST_PROTOCOL)
+            os.rename(temp_filename, self.filename)
+        except (IOError, OSError) as e:
+            rospy.logwarn("App Manager : failed to save the rapp index [%s][%s]" % (self.filename, str(e)))
+            return False
+        self._dirty = False
+        return True
+
+    def __len__(self):
+        return len(self._entries)
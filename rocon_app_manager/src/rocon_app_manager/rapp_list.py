@@ -22,8 +22,7 @@
 import os
 import rospy
 import yaml
-import rospkg
-from .rapp import Rapp
+from .rapp_loader import RappLoader
 
 ##############################################################################
 # Class
@@ -38,42 +37,57 @@ class RappListFile(object):
     where 'xxx' represents the package name and 'yyy' is the app name.
     """
 
-    def __init__(self, filename):
+    def __init__(self, filename, rapp_index=None, loader=None):
         '''
           Just configures the container with basic parameters.
 
           @param filename : file path to the .rapps file.
           @type str
+          @param rapp_index : compiled rapp definitions to load from/save to (optional, ignored if a loader is given)
+          @type rapp_index.RappIndex
+          @param loader : shared loader for parsing the rapps (optional, rapps are parsed serially if None)
+          @type rapp_loader.RappLoader
         '''
         if os.path.isfile(filename):
             self.filename = filename
+            self.loader = loader if loader is not None else RappLoader(rapp_index=rapp_index)
             self.available_apps = []
+            self.invalid_apps = {}  # resource name : reason it failed to load
+            self.app_resources = []  # (resource name, share) pairs as listed in the file
             self._file_mtime = None
             self.update()
         else:
             raise IOError("rapp list file not found [%s]" % filename)
 
-    def _load(self):
-        available_apps = []
-        rospy.loginfo("App Manager : loading apps file [%s]" % self.filename)
+    def read_app_resources(self):
+        '''
+          Read the rapp names and shares from the file (without loading the rapps).
+
+          @return (resource name, share) pairs in the order they are listed
+          @rtype [(str, int)]
+        '''
+        app_resources = []
         with open(self.filename) as f:
             apps_yaml = yaml.load(f)
             if not 'apps' in apps_yaml:
                 rospy.logerr("App Manager : apps file [%s] is missing required key [%s]" % (self.filename, 'apps'))
-            rospack = rospkg.RosPack()
             for app_resource in apps_yaml['apps']:
-                app = None
                 app_name = app_resource['name']
                 app_share = app_resource.get('share', 1)
                 if app_share < -1:  # -1 is reserved for App.SHAREABLE_WITH_NO_LIMIT
                     rospy.logerr("App Manager: incorrectly configured a negative number for app shares, defaulting to 1 [%s]" % app_name)
                     app_share = 1
-                try:
-                    app = Rapp(app_name, app_share, rospack)
-                    available_apps.append(app)
-                except IOError as e:
-                    rospy.logwarn("App Manager : failed to load '%s' [%s]" % (app_name, str(e)))
+                app_resources.append((app_name, app_share))
+        return app_resources
+
+    def _load(self):
+        rospy.loginfo("App Manager : loading apps file [%s]" % self.filename)
+        self.app_resources = self.read_app_resources()
+        available_apps, invalid_apps = self.loader.load(self.app_resources)
+        for app_name in sorted(invalid_apps.keys()):
+            rospy.logwarn("App Manager : failed to load '%s' [%s]" % (app_name, invalid_apps[app_name]))
         self.available_apps = available_apps
+        self.invalid_apps = invalid_apps
 
     def update(self):
         """
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+#
+# License: BSD
+#   https://raw.github.com/robotics-in-concert/rocon_app_platform/master/rocon_app_manager/LICENSE
+#
+##############################################################################
+# Overview
+##############################################################################
+'''
+ Loads rapp definitions for the rapp lists. A single, pre-warmed package
+ cache is shared across every list and rapps that aren't in the rapp index
+ are parsed in parallel on a pool of worker processes. Failures are
+ collected per rapp rather than aborting the whole load.
+
+ Worker processes are only used offline (e.g. by the rapp indexer). Inside a
+ running node, rapps are parsed serially - forking a multithreaded rospy node
+ risks deadlocking the children on locks held by its threads, and parsing is
+ cpu bound, so worker threads would gain nothing under the GIL.
+'''
+##############################################################################
+# Imports
+##############################################################################
+
+import signal
+import logging
+import multiprocessing
+import rospkg
+import rospy
+from .rapp import Rapp
+
+##############################################################################
+# Workers
+##############################################################################
+
+_worker_rospack = None  # inherited (already warm) from the parent when the pool forks
+
+
+def _init_worker(rospack):
+    global _worker_rospack
+    _worker_rospack = rospack
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # leave interrupts to the parent
+    # the rosout connections belong to the parent, the parent logs the results instead
+    logging.getLogger('rosout').disabled = True
+
+
+def _parse_rapp(resource_name):
+    '''
+      @return (resource name, (filename, data, source files) or None, error or None)
+      @rtype (str, (str, rapp.RappData, [str]), str)
+    '''
+    try:
+        rapp = Rapp(resource_name, 1, _worker_rospack)
+    except Exception as e:
+        return resource_name, None, "%s: %s" % (type(e).__name__, str(e))
+    return resource_name, (rapp.filename, rapp.data, rapp.source_files), None
+
+##############################################################################
+# Class
+##############################################################################
+
+
+class RappLoader(object):
+    '''
+      Loads rapps, possibly across several rapp lists, with a shared package
+      cache, rapp index and worker pool. Call close() when finished to shut
+      down the workers.
+    '''
+    __slots__ = ['rospack', 'rapp_index', 'workers', '_pool']
+
+    def __init__(self, rospack=None, rapp_index=None, workers=1):
+        '''
+          @param rospack : package cache to share (a new one is created if None)
+          @type rospkg.RosPack
+          @param rapp_index : compiled rapp definitions to load from/save to (optional)
+          @type rapp_index.RappIndex
+          @param workers : number of worker processes for parsing rapps (0 for one per cpu, 1 to parse in
+                           this process), ignored inside a running node where rapps are always parsed serially
+          @type int
+        '''
+        self.rospack = rospack if rospack is not None else rospkg.RosPack()
+        self.rapp_index = rapp_index
+        self.workers = workers if workers > 0 else multiprocessing.cpu_count()
+        self._pool = None
+        self.rospack.list()  # crawl the package path once, up front (workers inherit the result)
+
+    def load(self, app_resources):
+        '''
+          @param app_resources : (resource name, share) pairs, e.g. ('rocon_apps/chirp', -1)
+          @type [(str, int)]
+          @return the rapps in the order given and the errors for those that failed to load, keyed by resource name
+          @rtype ([Rapp], { str : str })
+        '''
+        definitions = {}
+        indexed = set()
+        errors = {}
+        pending = []
+        for (name, unused_share) in app_resources:
+            definition = self.rapp_index.lookup(name) if self.rapp_index is not None else None
+            if definition is None:
+                pending.append(name)
+            else:
+                definitions[name] = definition
+                indexed.add(name)
+        if self.workers > 1 and len(pending) > 1 and not rospy.core.is_initialized():
+            if self._pool is None:
+                self._pool = multiprocessing.Pool(min(self.workers, len(pending)), _init_worker, (self.rospack,))
+            chunksize = max(1, len(pending) // (4 * self.workers))
+            for (name, definition, error) in self._pool.imap_unordered(_parse_rapp, pending, chunksize):
+                if error is None:
+                    definitions[name] = definition
+                else:
+                    errors[name] = error
+        rapps = []
+        for (name, share) in app_resources:
+            if name in errors:
+                continue
+            try:
+                # rapps from the index are already up to date there
+                rapp_index = self.rapp_index if name not in indexed else None
+                rapps.append(Rapp(name, share, self.rospack, rapp_index, definitions.get(name)))
+            except Exception as e:
+                errors[name] = "%s: %s" % (type(e).__name__, str(e))
+        return rapps, errors
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
@@ -11,20 +11,34 @@ import rospy
 import os
 import sys
 import time
-import thread
+import threading
 import traceback
+import collections
 import roslaunch.pmon
+import rospkg
+from .rapp import RappInstance, RappProcessMonitor
 from .rapp_list import RappListFile
-from .utils import platform_compatible, platform_tuple
+from .rapp_loader import RappLoader
+from .rapp_watcher import RappWatcher
+from .scheduler import AdmissionScheduler
+from .rapp_index import RappIndex, default_index_path
+from .utils import PlatformIndex, platform_tuple, icon_cache, connections_by_type
+from .app_list import SerializedAppList, SerializedGetAppListResponse
+from .readiness import wait_for_connections
+from .latency import LatencyTracker, span
+from .remote_gateways import RemoteGatewayCache
 import rocon_utilities
 from rocon_utilities import create_gateway_rule, create_gateway_remote_rule
 import rocon_app_manager_msgs.msg as rapp_manager_msgs
 import rocon_app_manager_msgs.srv as rapp_manager_srvs
+import rocon_app_manager.srv as catalog_srvs
 import rocon_std_msgs.msg as rocon_std_msgs
 import rocon_std_msgs.srv as rocon_std_srvs
 import gateway_msgs.msg as gateway_msgs
 import gateway_msgs.srv as gateway_srvs
 import std_msgs.msg as std_msgs
+import diagnostic_msgs.msg as diagnostic_msgs
+import diagnostic_msgs.srv as diagnostic_srvs
 
 # local imports
 import exceptions
@@ -49,22 +63,56 @@ class RappManager(object):
         self._namespace = None  # Namespace that gets used as default namespace for rapp connections
         self._gateway_name = None  # Name of our local gateway (if available)
         self._gateway_ip = None  # IP/Hostname of our local gateway if available
+        self._gateway_connected = False  # as last reported by our local gateway
         self._remote_name = None  # Name (gateway name) for the entity that is remote controlling this app manager
-        self._current_rapp = None  # App that is running, otherwise None
+        self._running_rapps = collections.OrderedDict()  # instance name : RappInstance, in the order they were started
+        self._stopping_rapps = set()  # RappInstances that are in the middle of stopping
+        self._operation_count = 0  # for generating asynchronous transition operation ids
+        self._running_rapps_lock = threading.RLock()
         self._application_namespace = None  # Push all app connections underneath this namespace
         roslaunch.pmon._init_signal_handlers()
+        self._process_monitor = RappProcessMonitor()  # shared by all rapp instances
         self._services = {}
         self._publishers = {}
+        self._published_app_status = {}  # rapp name : status as last published on app_status
+        self._latency = LatencyTracker()  # timing of each phase of start, stop and invite transitions
+        self._rapps = {}  # every loaded rapp (compatible with this platform or not) keyed by name
+        self._platform_index = PlatformIndex()  # names of the loaded rapps bucketed by platform
+        self._catalog_epoch = int(time.time())  # distinguishes catalog versions across restarts
+        self._catalog_version = 0  # bumped whenever the app list is republished or a rapp's status changes
+        self._deferred_reloads = set()  # names of running rapps with changes to apply when they stop
+        self._reload_lock = threading.Lock()
+        self._rapp_watcher = None
+        self._invalid_rapps = set()  # names of rapps that failed to load, retried on every reload
+        self._standby_rapps = []  # names of rapps to keep prepared for a quick start
+        self._standby_remappings = {}  # rapp name : remappings it was last started with
+        self._standby_lock = threading.Lock()
 
         self._setup_ros_parameters()
+        self._standby_rapps = [name for name in self._param['standby_rapps'] + [self._param['auto_start_rapp']] if name]
+        self._remote_controller_whitelist = frozenset(self._param['remote_controller_whitelist'])
+        self._remote_controller_blacklist = frozenset(self._param['remote_controller_blacklist'])
+        icon_cache.digests_only = self._param['icons_by_digest']
         self._set_platform_info()
         self._init_gateway_services()
         self._init_default_service_names()
 
         self._get_pre_installed_app_list()  # It sets up an app directory and load installed app list from directory
+        self._scheduler = AdmissionScheduler(self._param['max_running_rapps'], self._param['rapp_queue_timeout'])
         self._initialising_services = False
         self._init_services()
         self._publish_app_list()
+        self._diagnostics_publisher = rospy.Publisher('/diagnostics', diagnostic_msgs.DiagnosticArray)
+        if self._param['latency_diagnostics_period'] > 0:
+            self._diagnostics_timer = rospy.Timer(rospy.Duration(self._param['latency_diagnostics_period']), self._publish_latency_diagnostics)
+        self._remote_gateways = RemoteGatewayCache(self._get_remote_gateway_info)
+        if self._param['local_remote_controllers_only']:
+            self._remote_gateways.start(self._param['remote_gateway_info_period'])
+        self._init_gateway_subscribers()
+        if self._param['watch_rapp_lists']:
+            self._rapp_watcher = RappWatcher(self._reload_rapps, self._param['rapp_list_poll_period'])
+            self._rapp_watcher.set_files(self._watched_rapp_files(), self._watched_rapp_directories())
+            rospy.on_shutdown(self._rapp_watcher.shutdown)
         if self._param['auto_start_rapp']:  # None and '' are both false here
             request = rapp_manager_srvs.StartAppRequest(self._param['auto_start_rapp'], [])
             unused_response = self._process_start_app(request)
@@ -80,15 +128,40 @@ class RappManager(object):
         self._param['platform_info']   = rospy.get_param('~platform_info', 'linux.*.ros.*')  #@IgnorePep8
         self._param['rapp_lists']      = rospy.get_param('~rapp_lists', '').split(';')  #@IgnorePep8
         self._param['auto_start_rapp'] = rospy.get_param('~auto_start_rapp', None)  #@IgnorePep8
+        # Semi colon separated rapps to keep prepared (launch configuration parsed and resolved) for a quick start
+        self._param['standby_rapps']   = rospy.get_param('~standby_rapps', '').split(';')  #@IgnorePep8
+        # Compiled rapp definitions, saves re-parsing unchanged rapps on every boot. Empty string disables.
+        self._param['rapp_index']      = rospy.get_param('~rapp_index', default_index_path())  #@IgnorePep8
+        # reload rapps when the rapp lists or rapp files change (with inotify, else polling with this period)
+        self._param['watch_rapp_lists'] = rospy.get_param('~watch_rapp_lists', True)
+        self._param['rapp_list_poll_period'] = rospy.get_param('~rapp_list_poll_period', 2.0)
         # Todo fix these up with proper whitelist/blacklists
         self._param['remote_controller_whitelist'] = rospy.get_param('~remote_controller_whitelist', [])
         self._param['remote_controller_blacklist'] = rospy.get_param('~remote_controller_blacklist', [])
         # Useful for local machine/simulation tests (e.g. chatter_concert)
         self._param['local_remote_controllers_only'] = rospy.get_param('~local_remote_controllers_only', False)
+        # period (s) for refreshing the cached remote gateway info used to check local invitations
+        self._param['remote_gateway_info_period'] = rospy.get_param('~remote_gateway_info_period', 5.0)
         # Check if rocon is telling us to be verbose about starting apps (this comes from the
         # rocon_launch --screen option). TODO : additionally a private parameter for the app manager so
         # people can configure this from yaml or roslaunch instead of rocon_launch
         self._param['app_output_to_screen'] = rospy.get_param('/rocon/screen', False)
+        # Concurrently running rapps (-1 for no limit), the per rapp limit is its share in the rapp list
+        self._param['max_running_rapps'] = rospy.get_param('~max_running_rapps', 1)
+        # How long a start request may wait for a free slot, zero rejects it immediately
+        self._param['rapp_queue_timeout'] = rospy.get_param('~rapp_queue_timeout', 0.0)
+        # Deadline for a started rapp's connections to register with the master before flipping regardless
+        self._param['rapp_ready_timeout'] = rospy.get_param('~rapp_ready_timeout', 5.0)
+        # Initial period between checks for those connections, backing off exponentially (up to a second)
+        self._param['rapp_ready_poll_period'] = rospy.get_param('~rapp_ready_poll_period', 0.05)
+        # Return from start_app/stop_app straight away with an operation id, progress goes out on 'transitions'
+        self._param['asynchronous_transitions'] = rospy.get_param('~asynchronous_transitions', False)
+        # Publish rapp status changes (name : status) on a separate topic so clients don't need the whole app_list
+        self._param['publish_app_status'] = rospy.get_param('~publish_app_status', False)
+        # Send icon digests instead of icons in app and platform info messages, clients fetch (and cache) them separately
+        self._param['icons_by_digest'] = rospy.get_param('~icons_by_digest', False)
+        # period (s) for publishing transition latency histograms on /diagnostics, zero to disable
+        self._param['latency_diagnostics_period'] = rospy.get_param('~latency_diagnostics_period', 10.0)
 
         # If we have list parameters - https://github.com/ros/ros_comm/pull/50/commits
         # self._param['rapp_lists'] = rospy.get_param('~rapp_lists', [])
@@ -100,9 +173,10 @@ class RappManager(object):
         self.platform_info.platform = self._param['robot_type']
         self.platform_info.system = rocon_std_msgs.PlatformInfo.SYSTEM_ROS
         self.platform_info.name = self._param['robot_name']
+        self._platform_tuple = platform_tuple(self.platform_info.os, self.platform_info.version, self.platform_info.system, self.platform_info.platform)
         try:
             filename = rocon_utilities.find_resource_from_string(self._param['robot_icon'])
-            self.platform_info.icon = rocon_utilities.icon_to_msg(filename)
+            self.platform_info.icon = icon_cache.icon_to_msg(filename)
         except exceptions.NotFoundException:
             rospy.logwarn("App Manager : icon resource not found [%s]" % self._param['robot_icon'])
             self.platform_info.icon = rocon_std_msgs.Icon()
@@ -116,15 +190,23 @@ class RappManager(object):
         self._default_service_names['list_apps'] = 'list_apps'
         self._default_service_names['status'] = 'status'
         self._default_service_names['invite'] = 'invite'
+        self._default_service_names['compatible_apps'] = 'compatible_apps'
+        self._default_service_names['list_apps_page'] = 'list_apps_page'
+        self._default_service_names['get_icon'] = 'get_icon'
         self._default_service_names['start_app'] = 'start_app'
         self._default_service_names['stop_app'] = 'stop_app'
+        self._default_service_names['latency_statistics'] = 'latency_statistics'
         # Latched publishers
         self._default_publisher_names = {}
         self._default_publisher_names['app_list'] = 'app_list'
+        # Regular publishers
+        if self._param['publish_app_status']:
+            self._default_publisher_names['app_status'] = 'app_status'
+        if self._param['asynchronous_transitions']:
+            self._default_publisher_names['transitions'] = 'transitions'
 
     def _init_gateway_services(self):
         self._gateway_services = {}
-        self._gateway_services['gateway_info'] = rocon_utilities.SubscriberProxy('~gateway_info', gateway_msgs.GatewayInfo)
         self._gateway_services['remote_gateway_info'] = rospy.ServiceProxy('~remote_gateway_info', gateway_srvs.RemoteGatewayInfo)
         self._gateway_services['flip'] = rospy.ServiceProxy('~flip', gateway_srvs.Remote)
         self._gateway_services['advertise'] = rospy.ServiceProxy('~advertise', gateway_srvs.Advertise)
@@ -132,6 +214,14 @@ class RappManager(object):
         self._gateway_publishers = {}
         self._gateway_publishers['force_update'] = rospy.Publisher("~force_update", std_msgs.Empty)
 
+    def _init_gateway_subscribers(self):
+        '''
+          Follow our gateway for the lifetime of the app manager. This comes after the
+          services are up since a connected gateway renames them.
+        '''
+        self._gateway_subscribers = {}
+        self._gateway_subscribers['gateway_info'] = rospy.Subscriber('~gateway_info', gateway_msgs.GatewayInfo, self._ros_gateway_info_callback)
+
     def _init_services(self):
         '''
           This initialises all the app manager services. It depends on whether we're initialising for standalone,
@@ -139,7 +229,7 @@ class RappManager(object):
         '''
         if self._initialising_services:
             # We could use a lock to protect this, but since the only places we call this is in the
-            # and in the spin(), then we just use a flag to protect.
+            # constructor and the gateway info callback, then we just use a flag to protect.
             return False
         self._initialising_services = True
         if self._services:
@@ -163,11 +253,21 @@ class RappManager(object):
             self._services['list_apps'] = rospy.Service(self._service_names['list_apps'], rapp_manager_srvs.GetAppList, self._process_get_app_list)
             self._services['status'] = rospy.Service(self._service_names['status'], rapp_manager_srvs.Status, self._process_status)
             self._services['invite'] = rospy.Service(self._service_names['invite'], rapp_manager_srvs.Invite, self._process_invite)
+            self._services['compatible_apps'] = rospy.Service(self._service_names['compatible_apps'], catalog_srvs.GetCompatibleApps, self._process_get_compatible_apps)
+            self._services['list_apps_page'] = rospy.Service(self._service_names['list_apps_page'], catalog_srvs.GetAppListPage, self._process_get_app_list_page)
+            self._services['get_icon'] = rospy.Service(self._service_names['get_icon'], catalog_srvs.GetIcon, self._process_get_icon)
+            # Local services
+            self._services['latency_statistics'] = rospy.Service(self._service_names['latency_statistics'], diagnostic_srvs.SelfTest, self._process_latency_statistics)
             # Flippable services
             self._services['start_app'] = rospy.Service(self._service_names['start_app'], rapp_manager_srvs.StartApp, self._process_start_app)
             self._services['stop_app'] = rospy.Service(self._service_names['stop_app'], rapp_manager_srvs.StopApp, self._process_stop_app)
             # Latched publishers
             self._publishers['app_list'] = rospy.Publisher(self._publisher_names['app_list'], rapp_manager_msgs.AppList, latch=True)
+            # Regular publishers
+            if 'app_status' in self._publisher_names:
+                self._publishers['app_status'] = rospy.Publisher(self._publisher_names['app_status'], rocon_std_msgs.KeyValue)
+            if 'transitions' in self._publisher_names:
+                self._publishers['transitions'] = rospy.Publisher(self._publisher_names['transitions'], diagnostic_msgs.DiagnosticStatus)
             # Force an update on the gateway
             self._gateway_publishers['force_update'].publish(std_msgs.Empty())
         except Exception as unused_e:
@@ -176,6 +276,7 @@ class RappManager(object):
             return False
         self._publish_app_list()
         self._initialising_services = False
+        self._schedule_standby()  # the application namespace may have changed
         return True
 
     def _get_pre_installed_app_list(self):
@@ -184,58 +285,229 @@ class RappManager(object):
         '''
         self.apps = {}
         self.apps['pre_installed'] = {}
+        self._rapp_index = RappIndex(self._param['rapp_index']) if self._param['rapp_index'] else None
+        rospack = rospkg.RosPack()  # shared by every list and rapp so the package path is only crawled once
+        loader = RappLoader(rospack, self._rapp_index)  # parses serially, prebuild the index with rapp_indexer.py to skip it
+        self._rapp_list_files = []
+        try:
+            for resource_name in self._param['rapp_lists']:
+                # should do some exception checking here, also utilise AppListFile properly.
+                filename = rocon_utilities.find_resource_from_string(resource_name, rospack=rospack)
+                self._rapp_list_files.append(RappListFile(filename, loader=loader))
+        finally:
+            loader.close()
+        invalid_apps = sorted(sum([app_list_file.invalid_apps.keys() for app_list_file in self._rapp_list_files], []))
+        self._invalid_rapps = set(invalid_apps)
+        if invalid_apps:
+            rospy.logwarn("App Manager : %s rapps failed to load %s" % (len(invalid_apps), invalid_apps))
         # Getting apps from installed list
-        for resource_name in self._param['rapp_lists']:
-            # should do some exception checking here, also utilise AppListFile properly.
-            filename = rocon_utilities.find_resource_from_string(resource_name)
-            app_list_file = RappListFile(filename)
+        for app_list_file in self._rapp_list_files:
             for app in app_list_file.available_apps:
-                if platform_compatible(platform_tuple(self.platform_info.os, self.platform_info.version, self.platform_info.system, self.platform_info.platform), app.data['platform']):
-                    self.apps['pre_installed'][app.data['name']] = app
+                self._rapps[app.data['name']] = app
+                self._platform_index.add(app.data['name'], app.data['platform'])
+        self.apps['pre_installed'] = self._compatible_rapps(self._rapps.values(), warn=True)
+        if self._rapp_index is not None:
+            self._rapp_index.save()
+
+    def _compatible_rapps(self, warn_about=None, warn=False):
+        '''
+          Look up the loaded rapps that are compatible with this platform in the platform index.
+
+          @param warn_about : rapps to warn about if they are incompatible (e.g. those just loaded)
+          @type [Rapp]
+          @param warn : warn about incompatible rapps
+          @type bool
+          @return the compatible rapps
+          @rtype { str : Rapp }
+        '''
+        names = self._platform_index.compatible(self._platform_tuple)
+        if warn and warn_about:
+            for app in warn_about:
+                if app.data['name'] not in names:
+                    rospy.logwarn('App : ' + str(app.data['name']) + ' is incompatible. App : (' + str(app.data['platform']) + ')  App Manager : (' + self._platform_tuple + ')')
+        return dict((name, self._rapps[name]) for name in names if name in self._rapps)
+
+    def get_compatible_apps(self, platform_tuple):
+        '''
+          List the loaded rapps that are compatible with the given platform, which
+          needn't be this app manager's own (e.g. for a concert checking what a
+          robot type could run).
+
+          @param platform_tuple : os.version.system.platform, wildcards allowed
+          @type str
+          @return compatible rapps, sorted by name
+          @rtype [Rapp]
+
+          @raise InvalidPlatformTupleException : if the platform tuple is invalid
+        '''
+        with self._running_rapps_lock:
+            rapps = self._rapps
+            names = self._platform_index.compatible(platform_tuple)
+        return [rapps[name] for name in sorted(names) if name in rapps]
+
+    def _process_get_compatible_apps(self, req):
+        response = catalog_srvs.GetCompatibleAppsResponse()
+        try:
+            rapps = self.get_compatible_apps(req.platform_info)
+        except exceptions.InvalidPlatformTupleException as e:
+            response.result = False
+            response.message = "invalid platform tuple [%s]" % str(e)
+            rospy.logwarn("App Manager : %s" % response.message)
+            return response
+        response.result = True
+        response.message = "Success"
+        response.apps = [rapp.to_serialized_msg(req.include_icons)[0] for rapp in rapps]
+        return response
+
+    def _watched_rapp_files(self):
+        '''
+          @return the rapp list files and the files every loaded rapp was parsed from
+          @rtype set of str
+        '''
+        files = set(app_list_file.filename for app_list_file in self._rapp_list_files)
+        for rapp in self._rapps.values():
+            files.update(rapp.source_files)
+        return files
+
+    def _watched_rapp_directories(self):
+        '''
+          Rapps that failed to load are retried on every reload, so watch where a fix
+          would turn up: the rapp list directories and their packages' directories, or
+          if a package isn't installed, the package path it would be installed into.
+
+          @return directories to watch for new or removed entries
+          @rtype set of str
+        '''
+        if not self._invalid_rapps:
+            return set()
+        directories = set(os.path.dirname(app_list_file.filename) for app_list_file in self._rapp_list_files)
+        rospack = rospkg.RosPack()
+        for name in self._invalid_rapps:
+            try:
+                directories.add(rospack.get_path(name.split('/')[0]))
+            except rospkg.ResourceNotFound:
+                directories.update(path for path in rospkg.get_ros_package_path().split(os.pathsep) if path)
+        return directories
+
+    def _reload_rapps(self, changed_files=None):
+        '''
+          Incrementally apply changes to the rapp lists and rapp files: rapps whose files
+          changed are re-parsed, rapps added to or removed from the lists are loaded or
+          dropped. Running rapps are left alone until they stop.
+
+          @param changed_files : files that have changed
+          @type set of str
+        '''
+        changed_files = changed_files if changed_files is not None else set()
+        with self._reload_lock:
+            resources = collections.OrderedDict()  # name : share, later lists override earlier ones
+            for app_list_file in self._rapp_list_files:
+                if app_list_file.filename in changed_files:
+                    try:
+                        app_list_file.app_resources = app_list_file.read_app_resources()
+                        rospy.loginfo("App Manager : reloading apps file [%s]" % app_list_file.filename)
+                    except Exception as e:
+                        rospy.logwarn("App Manager : failed to reload apps file, keeping the old list [%s][%s]" % (app_list_file.filename, str(e)))
+                resources.update(app_list_file.app_resources)
+            with self._running_rapps_lock:
+                running = set(instance.rapp.data['name'] for instance in self._running_rapps.values())
+            pending = []
+            for name, share in resources.items():
+                rapp = self._rapps.get(name)
+                if rapp is not None and name not in self._deferred_reloads and not changed_files.intersection(rapp.source_files):
+                    rapp.data['share'] = share
+                elif name in running:
+                    self._deferred_reloads.add(name)
                 else:
-                    rospy.logwarn('App : ' + str(app.data['name']) + ' is incompatible. App : (' + str(app.data['platform']) + ')  App Manager : (' +
-                                  str(self.platform_info.os) + '.' + str(self.platform_info.version) + '.' + str(self.platform_info.system) + '.' + str(self.platform_info.platform) + ')')
+                    pending.append((name, share))
+            removed = [name for name in self._rapps if name not in resources]
+            self._invalid_rapps.intersection_update(resources.keys())  # dropped from the lists
+            if not pending and not removed:
+                return
+            loaded = []
+            if pending:
+                loader = RappLoader(rospkg.RosPack(), self._rapp_index)  # fresh, packages may have been installed
+                try:
+                    loaded, invalid_apps = loader.load(pending)
+                finally:
+                    loader.close()
+                for name in sorted(invalid_apps.keys()):
+                    rospy.logwarn("App Manager : failed to load '%s' [%s]" % (name, invalid_apps[name]))
+                    removed.append(name)
+                self._invalid_rapps.difference_update(name for (name, unused_share) in pending)
+                self._invalid_rapps.update(invalid_apps.keys())
+            with self._running_rapps_lock:
+                running = set(instance.rapp.data['name'] for instance in self._running_rapps.values())
+                rapps = dict(self._rapps)
+                added = []
+                for name in removed:
+                    if name in running:
+                        self._deferred_reloads.add(name)
+                    elif rapps.pop(name, None) is not None:
+                        self._platform_index.remove(name)
+                        self._deferred_reloads.discard(name)
+                        rospy.loginfo("App Manager : removed app '%s'" % name)
+                for rapp in loaded:
+                    name = rapp.data['name']
+                    if name in running:  # started while it was being parsed
+                        self._deferred_reloads.add(name)
+                        continue
+                    rospy.loginfo("App Manager : %s app '%s'" % ('reloaded' if name in rapps else 'added', name))
+                    self._deferred_reloads.discard(name)
+                    rapps[name] = rapp
+                    added.append(rapp)
+                    self._platform_index.add(name, rapp.data['platform'])
+                self._rapps = rapps
+                self.apps['pre_installed'] = self._compatible_rapps(added, warn=True)
+            if self._rapp_index is not None:
+                self._rapp_index.save()
+            if self._rapp_watcher is not None:
+                self._rapp_watcher.set_files(self._watched_rapp_files(), self._watched_rapp_directories())
+        self._publish_app_list()
 
     ##########################################################################
     # Ros Callbacks
     ##########################################################################
 
     def _process_invite(self, req):
-        # Todo : add checks for whether client is currently busy or not
-        response = rapp_manager_srvs.InviteResponse(True, rapp_manager_msgs.ErrorCodes.SUCCESS, "")
-        if self._param['local_remote_controllers_only']:
-            if self._gateway_name is None:
-                return rapp_manager_srvs.InviteResponse(False,
-                                                        rapp_manager_msgs.ErrorCodes.NO_LOCAL_GATEWAY,
-                                                        "no gateway connection yet, invite impossible.")
-            remote_gateway_info_request = gateway_srvs.RemoteGatewayInfoRequest()
-            remote_gateway_info_request.gateways = []
-            remote_gateway_info_response = self._gateway_services['remote_gateway_info'](remote_gateway_info_request)
-            remote_target_name = req.remote_target_name
-            remote_target_ip = None
-            for gateway in remote_gateway_info_response.gateways:
-                if gateway.name == remote_target_name:
-                    remote_target_ip = gateway.ip
-                    break
-            if remote_target_ip is not None and self._gateway_ip == remote_target_ip:
+        with span(self._latency, 'invite', 'total'):
+            # Todo : add checks for whether client is currently busy or not
+            response = rapp_manager_srvs.InviteResponse(True, rapp_manager_msgs.ErrorCodes.SUCCESS, "")
+            if self._param['local_remote_controllers_only']:
+                if self._gateway_name is None:
+                    return rapp_manager_srvs.InviteResponse(False,
+                                                            rapp_manager_msgs.ErrorCodes.NO_LOCAL_GATEWAY,
+                                                            "no gateway connection yet, invite impossible.")
+                with span(self._latency, 'invite', 'remote_gateway_info'):
+                    remote_target_ip = self._remote_gateways.lookup(req.remote_target_name)
+                if remote_target_ip is not None and self._gateway_ip == remote_target_ip:
+                    response.result = self._accept_invitation(req)
+                    if not response.result:
+                        response.error_code = rapp_manager_msgs.ErrorCodes.UNKNOWN  # Todo specify later
+                else:
+                    return rapp_manager_srvs.InviteResponse(False,
+                                     rapp_manager_msgs.ErrorCodes.LOCAL_INVITATIONS_ONLY,
+                                     "local invitations only permitted.")
+            elif req.remote_target_name in self._remote_controller_whitelist:
+                response.result = self._accept_invitation(req)
+                if not response.result:
+                    response.error_code = rapp_manager_msgs.ErrorCodes.UNKNOWN  # Todo specify later
+            elif not self._remote_controller_whitelist and req.remote_target_name not in self._remote_controller_blacklist:
                 response.result = self._accept_invitation(req)
                 if not response.result:
                     response.error_code = rapp_manager_msgs.ErrorCodes.UNKNOWN  # Todo specify later
             else:
-                return rapp_manager_srvs.InviteResponse(False,
-                                 rapp_manager_msgs.ErrorCodes.LOCAL_INVITATIONS_ONLY,
-                                 "local invitations only permitted.")
-        elif req.remote_target_name in self._param['remote_controller_whitelist']:
-            response.result = self._accept_invitation(req)
-            if not response.result:
-                response.error_code = rapp_manager_msgs.ErrorCodes.UNKNOWN  # Todo specify later
-        elif len(self._param['remote_controller_whitelist']) == 0 and req.remote_target_name not in self._param['remote_controller_blacklist']:
-            response.result = self._accept_invitation(req)
-            if not response.result:
-                response.error_code = rapp_manager_msgs.ErrorCodes.UNKNOWN  # Todo specify later
-        else:
-            return rapp_manager_srvs.InviteResponse(False, rapp_manager_msgs.ErrorCodes.UNKNOWN)  # Todo specify later
-        return response
+                return rapp_manager_srvs.InviteResponse(False, rapp_manager_msgs.ErrorCodes.UNKNOWN)  # Todo specify later
+            return response
+
+    def _get_remote_gateway_info(self):
+        '''
+          @return info for all the remote gateways known to our gateway
+          @rtype [gateway_msgs.RemoteGateway]
+        '''
+        remote_gateway_info_request = gateway_srvs.RemoteGatewayInfoRequest()
+        remote_gateway_info_request.gateways = []
+        return self._gateway_services['remote_gateway_info'](remote_gateway_info_request).gateways
 
     def _accept_invitation(self, req):
         # Abort checks
@@ -246,6 +518,7 @@ class RappManager(object):
             rospy.logwarn("App Manager : bastards are sending us repeat invites, so we ignore - we are already working for them! [%s]" % self._remote_name)
             return True
         # Variable setting
+        previous_application_namespace = self._application_namespace
         if req.application_namespace == '':
             if self._gateway_name:
                 self._application_namespace = self._gateway_name + "/" + RappManager.default_application_namespace
@@ -256,8 +529,7 @@ class RappManager(object):
         # Flips/Unflips
         try:
             self._flip_connections(req.remote_target_name,
-                                   [self._service_names['start_app'], self._service_names['stop_app']],
-                                   gateway_msgs.ConnectionType.SERVICE,
+                                   {gateway_msgs.ConnectionType.SERVICE: [self._service_names['start_app'], self._service_names['stop_app']]},
                                    req.cancel
                                    )
         except Exception as unused_e:
@@ -267,17 +539,35 @@ class RappManager(object):
         if req.cancel:
             if req.remote_target_name == self._remote_name:
                 rospy.loginfo("App Manager : cancelling the relayed controls to remote system [%s]" % str(req.remote_target_name))
-                if self._current_rapp:
+                if self._running_rapps:
                     self._process_stop_app()
                 self._remote_name = None
         else:
             rospy.loginfo("App Manager : accepting invitation to relay controls to remote system [%s]" % str(req.remote_target_name))
             self._remote_name = req.remote_target_name
+        if self._application_namespace != previous_application_namespace:
+            self._schedule_standby()  # prepared under the old namespace
         return True
 
     def _process_platform_info(self, req):
         return rocon_std_srvs.GetPlatformInfoResponse(self.platform_info)
 
+    def _process_latency_statistics(self, req):
+        hardware_id = self._gateway_name if self._gateway_name else self._param['robot_name']
+        return diagnostic_srvs.SelfTestResponse(hardware_id, True, self._latency.to_msgs(hardware_id))
+
+    def _publish_latency_diagnostics(self, unused_event=None):
+        hardware_id = self._gateway_name if self._gateway_name else self._param['robot_name']
+        statuses = self._latency.to_msgs(hardware_id)
+        if not statuses:
+            return
+        diagnostics = diagnostic_msgs.DiagnosticArray(status=statuses)
+        diagnostics.header.stamp = rospy.Time.now()
+        try:
+            self._diagnostics_publisher.publish(diagnostics)
+        except rospy.exceptions.ROSException:  # publishing to a closed topic.
+            pass
+
     def _process_status(self, req):
         '''
           Serve some details about the current app manager status:
@@ -286,13 +576,17 @@ class RappManager(object):
           - the namespace it is publishing it and its apps interfaces on
           - the current app status (runnning or stopped)
 
+          If several rapps are running, this reports the most recently started
+          (list_apps reports all of them).
+
           @param req : status request object (empty)
           @type rapp_manager_srvs.StatusRequest
         '''
         response = rapp_manager_srvs.StatusResponse()
-        if self._current_rapp:
+        running_rapps = self._running_rapps.values()
+        if running_rapps:
             response.application_status = rapp_manager_msgs.Constants.APP_RUNNING
-            response.application = self._current_rapp.to_msg()
+            response.application = running_rapps[-1].to_msg()
         else:
             response.application_status = rapp_manager_msgs.Constants.APP_STOPPED
             response.application = rapp_manager_msgs.App()
@@ -304,45 +598,158 @@ class RappManager(object):
         return response
 
     def _get_app_list(self):
-        app_list = []
-        for app_name in self.apps['pre_installed']:
-            app = self.apps['pre_installed'][app_name]
-            app_list.append(app.to_msg())
-        return app_list
+        '''
+          @return (msg, serialized msg) pairs for the available and running apps.
+          @rtype ([(rapp_manager_msgs.App, str)], [(rapp_manager_msgs.App, str)])
+        '''
+        apps = self.apps['pre_installed']
+        available_apps = [apps[name].to_serialized_msg() for name in sorted(apps.keys())]
+        running_apps = [instance.to_serialized_msg() for instance in self._running_rapps.values()]
+        return available_apps, running_apps
 
     def _process_get_app_list(self, req):
-        response = rapp_manager_srvs.GetAppListResponse()
-        response.available_apps.extend(self._get_app_list())
-        response.running_apps = []
-        if self._current_rapp:
-            response.running_apps.append(self._current_rapp.to_msg())
+        return SerializedGetAppListResponse(*self._get_app_list())
+
+    def catalog_version(self):
+        '''
+          @return a token that changes whenever the app list (available apps, their status or running apps) may have changed
+          @rtype str
+        '''
+        return "%x.%d" % (self._catalog_epoch, self._catalog_version)
+
+    def get_app_list_page(self, offset=0, limit=0, name_prefix=None, status=None, client_type=None, include_icons=True, version=None):
+        '''
+          A page of the app list, for clients that can't afford the whole catalog
+          (with icons) in one response. Available apps are ordered by name so
+          successive pages are stable. Running apps are filtered the same way but
+          not paged (there are only ever a few).
+
+          @param offset : index of the first matching available app to return
+          @type int
+          @param limit : maximum number of available apps to return, zero for no limit
+          @type int
+          @param name_prefix : only apps whose names start with this, e.g. 'rocon_apps/'
+          @type str
+          @param status : only apps with this status: 'Ready', 'Running' (any instance running) or
+                          the error a failed start or stop left, e.g. 'Error While launching ...'
+          @type str
+          @param client_type : only apps with a pairing client of this type, e.g. 'android'
+          @type str
+          @param include_icons : if false, icons are left empty
+          @type bool
+          @param version : catalog version the client already has, if it is still current, no list is returned
+          @type str
+          @return (catalog version, total number of matching available apps, response or None if unchanged)
+          @rtype (str, int, rapp_manager_srvs.GetAppListResponse)
+        '''
+        with self._running_rapps_lock:
+            current_version = self.catalog_version()
+            if version == current_version:
+                return current_version, None, None
+            apps = self.apps['pre_installed']
+            available_apps = [apps[name] for name in sorted(apps.keys()) if not name_prefix or name.startswith(name_prefix)]
+            running_apps = list(self._running_rapps.values())
+
+        def matches(rapp):
+            if status is not None and rapp.data['status'] != status:
+                return False
+            if client_type is not None and client_type not in [c.client_type for c in rapp.data['pairing_clients']]:
+                return False
+            return True
+        available_apps = [app for app in available_apps if matches(app)]
+        page = available_apps[offset:offset + limit] if limit > 0 else available_apps[offset:]
+        running_apps = [instance for instance in running_apps
+                        if (not name_prefix or instance.rapp.data['name'].startswith(name_prefix)) and matches(instance.rapp)]
+        response = SerializedGetAppListResponse([app.to_serialized_msg(include_icons) for app in page],
+                                                [instance.to_serialized_msg(include_icons) for instance in running_apps])
+        return current_version, len(available_apps), response
+
+    def _process_get_app_list_page(self, req):
+        response = catalog_srvs.GetAppListPageResponse()
+        version, total, page = self.get_app_list_page(req.offset, req.limit,
+                                                      req.name_prefix or None, req.status or None, req.client_type or None,
+                                                      req.include_icons, req.version or None)
+        response.version = version
+        if page is None:
+            response.unchanged = True
+            return response
+        response.total = total
+        response.available_apps = page.available_apps
+        response.running_apps = page.running_apps
         return response
 
+    def get_icon(self, digest, size=0):
+        '''
+          Fetch an icon by the digest sent in its place in app messages (see
+          the icons_by_digest parameter).
+
+          @param digest : icon digest, e.g. the format of an icon reference ('sha1:...')
+          @type str
+          @param size : if non-zero, a thumbnail that fits within size x size pixels
+          @type int
+          @return the icon
+          @rtype rocon_std_msgs.Icon
+
+          @raise NotFoundException : if there is no icon with that digest
+        '''
+        return icon_cache.get(digest, size)
+
+    def _process_get_icon(self, req):
+        response = catalog_srvs.GetIconResponse()
+        try:
+            response.icon = self.get_icon(req.digest, req.size)
+        except exceptions.NotFoundException as e:
+            response.found = False
+            rospy.logwarn("App Manager : %s" % str(e))
+            return response
+        response.found = True
+        return response
+
+    def _bump_catalog_version(self):
+        '''
+          Invalidate the catalog version clients hold, e.g. when a rapp's status changes
+          ahead of the app list going out.
+        '''
+        with self._running_rapps_lock:
+            self._catalog_version += 1
+
     def _publish_app_list(self):
         '''
-          Publishes an updated list of available and running apps (in that order).
+          Publishes an updated list of available and running apps (in that order). The
+          list is latched, so it is published pre-serialized to save re-serializing it for
+          each late subscriber. If enabled, rapp status changes since the last publication
+          also go out separately on the light weight app_status topic.
         '''
+        self._bump_catalog_version()
         try:
-            if self._current_rapp:
-                self._publishers['app_list'].publish(self._get_app_list(), [self._current_rapp.to_msg()])
-            else:
-                self._publishers['app_list'].publish(self._get_app_list(), [])
+            self._publishers['app_list'].publish(SerializedAppList(*self._get_app_list()))
         except KeyError:
             pass
         except rospy.exceptions.ROSException:  # publishing to a closed topic.
             pass
+        self._publish_app_status()
+
+    def _publish_app_status(self):
+        '''
+          Publish a rapp name : status pair for every rapp whose status changed since
+          this was last called. Saves slow links to paired masters from having to
+          wait on the whole app list (with icons) on every start/stop.
+        '''
+        statuses = dict((name, app.data['status']) for name, app in self.apps['pre_installed'].items())
+        changes = [(name, status) for name, status in statuses.items() if self._published_app_status.get(name) != status]
+        self._published_app_status = statuses
+        if 'app_status' not in self._publishers:
+            return
+        try:
+            for name, status in changes:
+                self._publishers['app_status'].publish(rocon_std_msgs.KeyValue(name, status))
+        except rospy.exceptions.ROSException:  # publishing to a closed topic.
+            pass
 
     def _process_start_app(self, req):
         resp = rapp_manager_srvs.StartAppResponse()
         resp.app_namespace = self._application_namespace
         rospy.loginfo("App Manager : request received to start app [%s]" % req.name)
-        if self._current_rapp:
-            resp.started = False
-            resp.message = "an app is already running [%s]" % self._current_rapp.data['name']
-            rospy.logwarn("App Manager : %s" % resp.message)
-            return resp
-
-        rospy.loginfo("App Manager : starting app : " + req.name)
 
         try:
             rapp = self.apps['pre_installed'][req.name]
@@ -352,74 +759,298 @@ class RappManager(object):
             rospy.logwarn("App Manager : %s" % resp.message)
             return resp
 
-        resp.started, resp.message, subscribers, publishers, services, action_clients, action_servers = \
-                        rapp.start(self._application_namespace, self._gateway_name, self.platform_info, req.remappings, self._param['app_output_to_screen'])
+        try:
+            with span(self._latency, 'start_app', 'admission', rapp.data['name']):
+                self._scheduler.admit(rapp.data['name'], rapp.data['share'])
+        except exceptions.AdmissionException as e:
+            resp.started = False
+            resp.message = str(e)
+            rospy.logwarn("App Manager : %s" % resp.message)
+            return resp
+
+        rospy.loginfo("App Manager : starting app : " + req.name)
+
+        instance = self._create_rapp_instance(rapp)
+        resp.app_namespace = instance.namespace
+        if self._param['asynchronous_transitions']:
+            resp.started = True
+            resp.message = self._start_operation('start_app', self._start_rapp_instance, instance, req.remappings)
+        else:
+            resp.started, resp.message = self._start_rapp_instance(instance, req.remappings)
+        return resp
+
+    def _start_rapp_instance(self, instance, remappings, operation_id=None):
+        '''
+          Launch a newly created rapp instance and flip its connections to the remote controller
+          (if there is one). Progress is published on the transitions topic if this is running
+          as an asynchronous operation.
+
+          @param instance : the rapp instance (admitted, but not yet started)
+          @type RappInstance
+          @param remappings : rules for the app flips.
+          @type list of rocon_std_msgs.msg.Remapping values.
+          @param operation_id : id of the asynchronous operation this is running for, None otherwise.
+          @type str
+          @return (started, message)
+          @rtype (bool, str)
+        '''
+        with span(self._latency, 'start_app', 'total', instance.rapp.data['name']):
+            return self._launch_rapp_instance(instance, remappings, operation_id)
+
+    def _launch_rapp_instance(self, instance, remappings, operation_id):
+        self._publish_transition(operation_id, instance, 'launching')
+        started, message, subscribers, publishers, services, action_clients, action_servers = \
+                        instance.start(self._gateway_name, self.platform_info, remappings, self._param['app_output_to_screen'], self._latency)
+        self._bump_catalog_version()  # its status has changed, the app list only goes out once it is ready
 
         rospy.loginfo("App Manager : %s" % self._remote_name)
-        # small pause (convenience only) to let connections to come up
-        # gateway watcher usually rolls over slowly. so this makes sure the flips get enacted on promptly
-        rospy.rostime.wallsleep(0.5)
-        if self._remote_name:
-            self._flip_connections(self._remote_name, subscribers, gateway_msgs.ConnectionType.SUBSCRIBER)
-            self._flip_connections(self._remote_name, publishers, gateway_msgs.ConnectionType.PUBLISHER)
-            self._flip_connections(self._remote_name, services, gateway_msgs.ConnectionType.SERVICE)
-            self._flip_connections(self._remote_name, action_clients, gateway_msgs.ConnectionType.ACTION_CLIENT)
-            self._flip_connections(self._remote_name, action_servers, gateway_msgs.ConnectionType.ACTION_SERVER)
-        if resp.started:
-            self._current_rapp = rapp
+        if started and self._remote_name:
+            # flip connections as soon as they come up - the gateway watcher usually rolls over
+            # slowly, so this makes sure the flips get enacted on promptly
+            # (usually all of them come up together, so this is just the one request to the gateway)
+            remote_name = self._remote_name
+            instance.remote_name = remote_name
+            connections = connections_by_type(subscribers, publishers, services, action_clients, action_servers)
+            with span(self._latency, 'start_app', 'ready', instance.rapp.data['name']):
+                unready = wait_for_connections(connections, lambda ready: self._flip_rapp_instance(instance, remote_name, ready), self._param['rapp_ready_timeout'], self._param['rapp_ready_poll_period'])
+            self._publish_transition(operation_id, instance, 'ready')
+            if unready:
+                # flip them regardless, the gateway will enact the rules if they turn up later
+                rospy.logwarn("App Manager : rapp connections did not come up in time %s" % str(sum(unready.values(), [])))
+                self._flip_rapp_instance(instance, remote_name, unready)
+            self._publish_transition(operation_id, instance, 'flipped', done=True)
+        elif started:
+            self._publish_transition(operation_id, instance, 'ready', done=True)
+        if started:
             self._publish_app_list()
-            thread.start_new_thread(self._monitor_rapp, ())
-        return resp
+            self._standby_remappings[instance.rapp.data['name']] = remappings
+            self._schedule_standby()
+        else:
+            self._release_rapp_instance(instance)
+            self._publish_app_list()
+            self._publish_transition(operation_id, instance, 'failed', message, done=True)
+        return started, message
+
+    def _flip_rapp_instance(self, instance, remote_name, connections):
+        '''
+          Flip a starting rapp instance's connections, unless it is already being stopped
+          (its connections may already have been unflipped).
+        '''
+        with instance.flip_lock:
+            with self._running_rapps_lock:
+                if self._running_rapps.get(instance.name) is not instance or instance in self._stopping_rapps:
+                    return
+            self._flip_connections(remote_name, connections)
 
     def _process_stop_app(self, req=None):
         '''
-          Stops a currently running rapp. This can be triggered via the stop_app service call (in which
-          case req is configured), or if the rapp monitoring thread detects that it has
-          naturally stopped by itself (in which case req is None).
+          Stops all currently running rapps. This can be triggered via the stop_app service call (in which
+          case req is configured), or when cancelling the relayed controls.
 
           @param req : variable configured when triggered from the service call.
         '''
         resp = rapp_manager_srvs.StopAppResponse()
-        if not self._current_rapp:
+        instances = self._running_rapps.values()
+        if not instances:
             resp.stopped = False
             resp.error_code = rapp_manager_msgs.ErrorCodes.RAPP_IS_NOT_RUNNING
             resp.message = "tried to stop a rapp, but no rapp found running"
             rospy.logwarn("App Manager : received a request to stop a rapp, but no rapp found running.")
             return resp
+        if self._param['asynchronous_transitions']:
+            resp.stopped = True
+            resp.message = self._start_operation('stop_app', self._stop_rapp_instances, instances)
+            return resp
+        resp.stopped, resp.message = self._stop_rapp_instances(instances)
+        return resp
 
-        rospy.loginfo("App Manager : stopping rapp : " + self._current_rapp.data['name'])
+    def _stop_rapp_instances(self, instances, operation_id=None):
+        '''
+          @return (stopped, message) : stopped is true only if all were stopped
+          @rtype (bool, str)
+        '''
+        results = [self._stop_rapp_instance(instance, operation_id) for instance in instances]
+        return all(stopped for (stopped, unused_message) in results), '; '.join(message for (unused_stopped, message) in results)
 
-        resp.stopped, resp.message, subscribers, publishers, services, action_clients, action_servers = \
-                self._current_rapp.stop()
+    def _stop_rapp_instance(self, instance, operation_id=None):
+        '''
+          Stops a running rapp instance. This is triggered either by the stop_app service, or by the
+          rapp's process monitor when it has naturally stopped by itself.
 
-        if self._remote_name:
-            self._flip_connections(self._remote_name, subscribers, gateway_msgs.ConnectionType.SUBSCRIBER, cancel_flag=True)
-            self._flip_connections(self._remote_name, publishers, gateway_msgs.ConnectionType.PUBLISHER, cancel_flag=True)
-            self._flip_connections(self._remote_name, services, gateway_msgs.ConnectionType.SERVICE, cancel_flag=True)
-            self._flip_connections(self._remote_name, action_clients, gateway_msgs.ConnectionType.ACTION_CLIENT, cancel_flag=True)
-            self._flip_connections(self._remote_name, action_servers, gateway_msgs.ConnectionType.ACTION_SERVER, cancel_flag=True)
-        if resp.stopped:
-            self._current_rapp = None
-            self._publish_app_list()
-        return resp
+          @param instance : the running rapp instance
+          @type RappInstance
+          @param operation_id : id of the asynchronous operation this is running for, None otherwise.
+          @type str
+          @return (stopped, message)
+          @rtype (bool, str)
+        '''
+        with self._running_rapps_lock:
+            if self._running_rapps.get(instance.name) is not instance or instance in self._stopping_rapps:
+                self._publish_transition(operation_id, instance, 'stopped', done=True)
+                return True, "Success"  # already stopped (or stopping) via another route
+            self._stopping_rapps.add(instance)
+        try:
+            rospy.loginfo("App Manager : stopping rapp : " + instance.name)
+            self._publish_transition(operation_id, instance, 'stopping')
 
-    ##########################################################################
-    # Utilities
-    ##########################################################################
+            with span(self._latency, 'stop_app', 'total', instance.rapp.data['name']):
+                stopped, message, subscribers, publishers, services, action_clients, action_servers = instance.stop(self._latency)
 
-    def _monitor_rapp(self):
+                if instance.remote_name:
+                    # waits on any flip the start is part way through, later ones see it stopping
+                    with instance.flip_lock:
+                        self._flip_connections(instance.remote_name,
+                                               connections_by_type(subscribers, publishers, services, action_clients, action_servers),
+                                               cancel_flag=True)
+            if stopped:
+                self._release_rapp_instance(instance)
+                if instance.rapp.data['name'] in self._deferred_reloads and not instance.rapp.instances:
+                    self._reload_rapps()
+                self._publish_app_list()
+                self._publish_transition(operation_id, instance, 'stopped', done=True)
+                self._schedule_standby()
+            else:
+                self._publish_app_list()  # its status has changed to the error
+                self._publish_transition(operation_id, instance, 'failed', message, done=True)
+        finally:
+            with self._running_rapps_lock:
+                self._stopping_rapps.discard(instance)
+        return stopped, message
+
+    def _start_operation(self, kind, method, *args):
         '''
-         Monitors an executing rapp's status to determine if it's finished
-         yet or not.Move this to the rapp_manager and pass it in via the app_monitor variable
-         in the constructor.
+          Run a transition in the background, reporting its progress on the transitions topic.
 
-         https://github.com/robotics-in-concert/rocon_app_platform/issues/31
+          @param kind : type of operation, e.g. start_app
+          @type str
+          @param method : the transition to run, must accept an operation_id keyword argument.
+          @type method
+          @return the operation id
+          @rtype str
         '''
-        while self._current_rapp:  # can be unset if stop_app service was directly called
-            if not self._current_rapp.is_running():
-                self._process_stop_app()
-                break
-            time.sleep(0.1)
+        with self._running_rapps_lock:
+            self._operation_count += 1
+            operation_id = "%s_%s" % (kind, self._operation_count)
+        thread = threading.Thread(target=method, args=args, kwargs={'operation_id': operation_id})
+        thread.daemon = True
+        thread.start()
+        return operation_id
+
+    def _publish_transition(self, operation_id, instance, phase, message='', done=False):
+        '''
+          Publish the progress of an asynchronous transition (no-op if not part of one).
+
+          @param operation_id : id of the asynchronous operation, None if not running as one.
+          @type str
+          @param instance : the rapp instance undergoing the transition
+          @type RappInstance
+          @param phase : launching, ready, flipped, stopping, stopped or failed
+          @type str
+          @param message : details (usually on failure)
+          @type str
+          @param done : whether this is the final phase of the operation
+          @type bool
+        '''
+        if operation_id is None or 'transitions' not in self._publishers:
+            return
+        status = diagnostic_msgs.DiagnosticStatus()
+        status.level = diagnostic_msgs.DiagnosticStatus.ERROR if phase == 'failed' else diagnostic_msgs.DiagnosticStatus.OK
+        status.name = operation_id
+        status.message = phase
+        status.hardware_id = self._gateway_name if self._gateway_name else self._param['robot_name']
+        status.values = [diagnostic_msgs.KeyValue('rapp', instance.rapp.data['name']),
+                         diagnostic_msgs.KeyValue('instance', instance.name),
+                         diagnostic_msgs.KeyValue('namespace', instance.namespace),
+                         diagnostic_msgs.KeyValue('done', str(done).lower()),
+                         diagnostic_msgs.KeyValue('details', message)]
+        try:
+            self._publishers['transitions'].publish(status)
+        except rospy.exceptions.ROSException:  # publishing to a closed topic.
+            pass
+
+    def _create_rapp_instance(self, rapp):
+        '''
+          Reserve a unique name and namespace for a new instance of the rapp. When only a single rapp
+          may run at a time, it runs directly in the application namespace, otherwise each instance gets
+          its own namespace underneath it.
+
+          @param rapp : an admitted rapp
+          @type Rapp
+          @return the (not yet started) instance
+          @rtype RappInstance
+        '''
+        with self._running_rapps_lock:
+            name, namespace = self._next_instance_name(rapp)
+            instance = RappInstance(rapp, name, namespace, exit_callback=self._stop_rapp_instance, process_monitor=self._process_monitor)
+            self._running_rapps[name] = instance
+        return instance
+
+    def _next_instance_name(self, rapp):
+        '''
+          @return the name and namespace the next instance of the rapp would get
+          @rtype (str, str)
+        '''
+        with self._running_rapps_lock:
+            basename = rapp.data['name'].split('/')[-1]
+            name = basename
+            index = 1
+            while name in self._running_rapps:
+                index += 1
+                name = "%s_%s" % (basename, index)
+            if self._param['max_running_rapps'] == 1:
+                namespace = self._application_namespace
+            else:
+                namespace = self._application_namespace + '/' + name
+        return name, namespace
+
+    def set_standby_rapps(self, names):
+        '''
+          Choose the rapps to keep prepared for a quick start, e.g. a concert's next
+          scheduled rapp. Replaces the standby_rapps parameter.
+
+          @param names : rapp names, e.g. ['rocon_apps/chirp']
+          @type [str]
+        '''
+        self._standby_rapps = list(names)
+        self._schedule_standby()
+
+    def _schedule_standby(self):
+        if not self._standby_rapps:
+            return
+        thread = threading.Thread(target=self._prepare_standby)
+        thread.daemon = True
+        thread.start()
+
+    def _prepare_standby(self):
+        '''
+          Prepare each standby rapp for its next start: the launch configuration is parsed,
+          remapped (with the remappings it was last started with) and copied under the
+          namespace the next instance will get, leaving only the launch and flips to
+          start_app.
+        '''
+        with self._standby_lock:
+            for name in self._standby_rapps:
+                rapp = self.apps['pre_installed'].get(name)
+                if rapp is None:
+                    continue
+                unused_instance_name, namespace = self._next_instance_name(rapp)
+                try:
+                    rapp.prepare_standby(namespace, self._gateway_name, self.platform_info,
+                                         self._standby_remappings.get(name, []), self._param['app_output_to_screen'])
+                except Exception as e:
+                    rospy.logwarn("App Manager : failed to prepare standby rapp [%s][%s]" % (name, str(e)))
+                    continue
+                rospy.logdebug("App Manager : standby rapp prepared [%s][%s]" % (name, namespace))
+
+    def _release_rapp_instance(self, instance):
+        with self._running_rapps_lock:
+            if self._running_rapps.get(instance.name) is instance:
+                del self._running_rapps[instance.name]
+                self._scheduler.release(instance.rapp.data['name'])
+
+    ##########################################################################
+    # Utilities
+    ##########################################################################
 
     def _load(self, directory, typ):
         '''
@@ -451,46 +1082,79 @@ class RappManager(object):
                 req.rules.append(create_gateway_rule(service_name, gateway_msgs.ConnectionType.SERVICE))
             unused_resp = self._gateway_services['advertise'](req)
 
-    def _flip_connections(self, remote_name, connection_names, connection_type, cancel_flag=False):
+    def _flip_connections(self, remote_name, connections, cancel_flag=False):
         '''
-          (Un)Flip a service to a remote gateway.
+          (Un)Flip connections to a remote gateway. All the connections go in a single
+          request to the gateway so a rapp transition costs just the one round trip.
 
           @param remote_name : the name of the remote gateway to flip to.
           @type str
-          @param connection_names : the topic/service/action_xxx names
-          @type list of str
-          @param connection_type : publisher, subscriber, service, action_client or action_server
-          @type gateway_msgs.ConnectionType
+          @param connections : the topic/service/action_xxx names keyed by their connection type
+          @type { gateway_msgs.ConnectionType : [str] }
           @param cancel_flag : whether or not we are flipping (false) or unflipping (true)
           @type bool
+
+          @return the result for each rule (true if successfully flipped), empty if there was nothing to flip
+          @rtype [(gateway_msgs.RemoteRule, bool)]
         '''
-        if len(connection_names) == 0:
-            return
         req = gateway_srvs.RemoteRequest()
         req.cancel = cancel_flag
         req.remotes = []
-        for connection_name in connection_names:
-            req.remotes.append(create_gateway_remote_rule(remote_name, create_gateway_rule(connection_name, connection_type)))
+        for connection_type, connection_names in connections.items():
+            for connection_name in connection_names:
+                req.remotes.append(create_gateway_remote_rule(remote_name, create_gateway_rule(connection_name, connection_type)))
+        if not req.remotes:
+            return []
         try:
-            resp = self._gateway_services['flip'](req)
+            with span(self._latency, 'gateway', 'unflip' if cancel_flag else 'flip'):
+                resp = self._gateway_services['flip'](req)
         except rospy.service.ServiceException:
             # often disappears when the gateway shuts down just before the app manager, ignore silently.
-            return
+            return [(remote, False) for remote in req.remotes]
+        # The gateway applies a request's rules as a whole, so they share the one result.
+        names = [os.path.basename(remote.rule.name) for remote in req.remotes]
         if resp.result == 0:
-            rospy.loginfo("App Manager : successfully flipped %s" % str([os.path.basename(name) for name in connection_names]))
+            rospy.loginfo("App Manager : successfully %s %s" % ('unflipped' if cancel_flag else 'flipped', str(names)))
         else:
-            rospy.logerr("App Manager : failed to flip [%s]" % resp.error_message)
+            rospy.logerr("App Manager : failed to %s %s [%s]" % ('unflip' if cancel_flag else 'flip', str(names), resp.error_message))
+        return [(remote, resp.result == 0) for remote in req.remotes]
 
+    def _ros_gateway_info_callback(self, msg):
+        '''
+          Services are brought up under the gateway's name as soon as it connects and
+          again whenever it comes back under a different name (e.g. a restarted gateway).
+          On a reconnect under the same name, the gateway is just prompted to update
+          its advertisements.
+
+          @param msg : our gateway's latest info
+          @type gateway_msgs.GatewayInfo
+        '''
+        if not msg.connected:
+            if self._gateway_connected:
+                rospy.logwarn("App Manager : lost the gateway connection [%s]" % self._gateway_name)
+            self._gateway_connected = False
+            return
+        reconnected = not self._gateway_connected
+        self._gateway_connected = True
+        if msg.ip != self._gateway_ip:
+            self._gateway_ip = msg.ip
+            self._remote_gateways.invalidate()
+        if msg.name == self._gateway_name:
+            if reconnected:
+                rospy.loginfo("App Manager : gateway reconnected [%s]" % msg.name)
+                self._gateway_publishers['force_update'].publish(std_msgs.Empty())
+            return
+        rospy.loginfo("App Manager : gateway connected, bringing up services under its name [%s]" % msg.name)
+        if self._running_rapps:
+            rospy.logwarn("App Manager : running rapps keep their old namespace until they are restarted")
+        previous_name = self._gateway_name
+        self._gateway_name = msg.name
+        self._remote_gateways.invalidate()
+        if not self._init_services():
+            rospy.logwarn("App Manager : failed to bring up services under the gateway name, will retry [%s]" % msg.name)
+            self._gateway_name = previous_name
+            self._gateway_connected = False  # so the next gateway info retries
 
     def spin(self):
-        while not rospy.is_shutdown():
-            gateway_info = self._gateway_services['gateway_info'](timeout=rospy.Duration(0.3))
-            if gateway_info:
-                if gateway_info.connected:
-                    self._gateway_name = gateway_info.name
-                    self._gateway_ip = gateway_info.ip
-                    if self._init_services():
-                        break
-            # don't need a sleep since our timeout on the service call acts like this.
         rospy.spin()
 
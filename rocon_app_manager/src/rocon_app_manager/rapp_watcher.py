@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+#
+# License: BSD
+#   https://raw.github.com/robotics-in-concert/rocon_app_platform/master/rocon_app_manager/LICENSE
+#
+##############################################################################
+# Overview
+##############################################################################
+'''
+ Watches the rapp list files and the files each rapp was parsed from, so
+ the rapp manager can reload them without restarting. Directories can be
+ watched too, for entries appearing or disappearing in them (e.g. the
+ package a rapp that failed to load was missing). Uses inotify (via
+ pyinotify) when it is available and otherwise falls back to polling
+ modification times.
+'''
+##############################################################################
+# Imports
+##############################################################################
+
+import os
+import threading
+import rospy
+from .launch_config import file_stamps
+
+try:
+    import pyinotify
+except ImportError:
+    pyinotify = None
+
+##############################################################################
+# Class
+##############################################################################
+
+
+class RappWatcher(object):
+    '''
+      Calls back with the set of watched files that changed (modified,
+      created, deleted or replaced), or watched directories whose entries
+      changed. Bursts of changes (e.g. an install) are
+      collected until things settle down and delivered together.
+    '''
+    __slots__ = ['_callback', '_poll_period', '_settle_time', '_files', '_directories', '_stamps',
+                 '_changed', '_lock', '_timer', '_notifier', '_watch_manager', '_watches', '_shutdown']
+
+    def __init__(self, callback, poll_period=2.0, settle_time=0.5):
+        '''
+          @param callback : called (from a background thread) with the set of files that changed
+          @type method
+          @param poll_period : time (s) between checks when polling (no inotify)
+          @type float
+          @param settle_time : time (s) to wait for further changes before calling back
+          @type float
+        '''
+        self._callback = callback
+        self._poll_period = poll_period
+        self._settle_time = settle_time
+        self._files = set()
+        self._directories = set()
+        self._stamps = {}  # file or directory : modification time
+        self._changed = set()
+        self._lock = threading.Lock()
+        self._timer = None
+        self._shutdown = False
+        self._watches = {}  # directory : watch descriptor
+        self._notifier = None
+        self._watch_manager = None
+        if pyinotify is not None:
+            self._watch_manager = pyinotify.WatchManager()
+            self._notifier = pyinotify.ThreadedNotifier(self._watch_manager, self._process_event)
+            self._notifier.daemon = True
+            self._notifier.start()
+            rospy.logdebug("App Manager : watching rapps with inotify")
+        else:
+            thread = threading.Thread(target=self._poll)
+            thread.daemon = True
+            thread.start()
+            rospy.logdebug("App Manager : watching rapps by polling (pyinotify not available)")
+
+    def set_files(self, filenames, directories=[]):
+        '''
+          Replace the set of files (and directories) being watched.
+
+          @param filenames : absolute paths
+          @type [str]
+          @param directories : absolute paths of directories to watch for entries being added or removed
+          @type [str]
+        '''
+        files = set(filenames)
+        watched_directories = set(directories)
+        watched = files | watched_directories
+        stamps = file_stamps(watched - set(self._stamps.keys()))  # a directory's mtime changes with its entries
+        with self._lock:
+            self._files = files
+            self._directories = watched_directories
+            self._stamps = dict((f, self._stamps[f]) if f in self._stamps else (f, stamps[f]) for f in watched)
+        if self._watch_manager is not None:
+            # watch the directories, editors and installers usually replace files rather than writing them in place
+            directories = set(os.path.dirname(f) for f in files) | watched_directories
+            for directory in set(self._watches.keys()) - directories:
+                self._watch_manager.rm_watch(self._watches.pop(directory))
+            mask = pyinotify.IN_CLOSE_WRITE | pyinotify.IN_CREATE | pyinotify.IN_DELETE | pyinotify.IN_MOVED_TO | pyinotify.IN_MOVED_FROM
+            for directory in directories - set(self._watches.keys()):
+                if os.path.isdir(directory):
+                    self._watches[directory] = self._watch_manager.add_watch(directory, mask)[directory]
+
+    def shutdown(self):
+        self._shutdown = True
+        if self._notifier is not None:
+            self._notifier.stop()
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+
+    def _process_event(self, event):
+        if event.pathname in self._files:
+            self._notify([event.pathname])
+        elif event.path in self._directories:
+            self._notify([event.path])
+
+    def _poll(self):
+        while not self._shutdown and not rospy.is_shutdown():
+            rospy.rostime.wallsleep(self._poll_period)
+            with self._lock:
+                previous = dict(self._stamps)
+            current = file_stamps(previous.keys())
+            changed = [f for f in current if current[f] != previous[f]]
+            if changed:
+                with self._lock:
+                    self._stamps.update((f, current[f]) for f in changed if f in self._stamps)
+                self._notify(changed)
+
+    def _notify(self, filenames):
+        with self._lock:
+            self._changed.update(filenames)
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self._settle_time, self._flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _flush(self):
+        with self._lock:
+            changed = self._changed
+            self._changed = set()
+            self._timer = None
+        if changed and not self._shutdown:
+            self._callback(changed)
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+#
+# License: BSD
+#   https://raw.github.com/robotics-in-concert/rocon_app_platform/master/rocon_app_manager/LICENSE
+#
+##############################################################################
+# Overview
+##############################################################################
+'''
+ Detects when a freshly launched rapp's interface connections have been
+ registered with the master, so they can be flipped as soon as they exist
+ rather than after an arbitrary pause.
+'''
+##############################################################################
+# Imports
+##############################################################################
+
+import time
+import socket
+import rosgraph
+import rospy
+import gateway_msgs.msg as gateway_msgs
+
+##############################################################################
+# Methods
+##############################################################################
+
+
+def _registered(pending, master):
+    '''
+      Check which of the pending connections are registered with the master, asking
+      only what is needed: a lookup per service, the published topics for publishers
+      and action clients and (only if any are pending) the system state for
+      subscribers and action servers, which the master has no targeted call for.
+
+      @return the registered connections, keyed by connection type
+      @rtype { gateway_msgs.ConnectionType : [str] }
+    '''
+    ready = {}
+    services = pending.get(gateway_msgs.ConnectionType.SERVICE, [])
+    registered_services = []
+    for name in services:
+        try:
+            master.lookupService(name)
+            registered_services.append(name)
+        except rosgraph.masterapi.Error:
+            pass  # not registered yet
+    if registered_services:
+        ready[gateway_msgs.ConnectionType.SERVICE] = registered_services
+    if pending.get(gateway_msgs.ConnectionType.PUBLISHER) or pending.get(gateway_msgs.ConnectionType.ACTION_CLIENT):
+        publishers = set(name for name, unused_type in master.getPublishedTopics(''))
+        for connection_type, suffix in [(gateway_msgs.ConnectionType.PUBLISHER, ''), (gateway_msgs.ConnectionType.ACTION_CLIENT, '/goal')]:
+            registered = [name for name in pending.get(connection_type, []) if name + suffix in publishers]
+            if registered:
+                ready[connection_type] = registered
+    if pending.get(gateway_msgs.ConnectionType.SUBSCRIBER) or pending.get(gateway_msgs.ConnectionType.ACTION_SERVER):
+        unused_publishers, subscribers, unused_services = master.getSystemState()
+        subscribers = set(name for name, unused_nodes in subscribers)
+        for connection_type, suffix in [(gateway_msgs.ConnectionType.SUBSCRIBER, ''), (gateway_msgs.ConnectionType.ACTION_SERVER, '/goal')]:
+            registered = [name for name in pending.get(connection_type, []) if name + suffix in subscribers]
+            if registered:
+                ready[connection_type] = registered
+    return ready
+
+
+def wait_for_connections(connections, ready_callback, timeout, poll_period=0.05, max_poll_period=1.0):
+    '''
+      Watch the master for the given connections, calling back with each batch
+      of connections as soon as they are registered. Checks start every poll_period
+      and back off exponentially (connections usually appear together, early on).
+
+      @param connections : connection names, keyed by connection type
+      @type { gateway_msgs.ConnectionType : [str] }
+      @param ready_callback : called with a { connection type : [names] } dict of newly registered connections
+      @type method
+      @param timeout : overall deadline (seconds) for all the connections to appear
+      @type float
+      @param poll_period : initial time (seconds) between checks on the master
+      @type float
+      @param max_poll_period : limit (seconds) on the time between checks
+      @type float
+
+      @return the connections that had not appeared by the deadline, keyed by connection type
+      @rtype { gateway_msgs.ConnectionType : [str] }
+    '''
+    pending = dict((connection_type, list(names)) for connection_type, names in connections.items() if names)
+    master = rosgraph.Master(rospy.get_name())
+    deadline = time.time() + timeout
+    while pending and not rospy.is_shutdown():
+        try:
+            ready = _registered(pending, master)
+        except (socket.error, rosgraph.masterapi.Error, rosgraph.masterapi.Failure) as e:
+            rospy.logwarn("App Manager : failed to check for connections on the master [%s]" % str(e))
+        else:
+            for connection_type, registered in ready.items():
+                pending[connection_type] = [name for name in pending[connection_type] if name not in registered]
+                if not pending[connection_type]:
+                    del pending[connection_type]
+            if ready:
+                ready_callback(ready)
+        time_left = deadline - time.time()
+        if not pending or time_left <= 0:
+            break
+        rospy.rostime.wallsleep(min(poll_period, time_left))
+        poll_period = min(poll_period * 2, max(max_poll_period, poll_period))
+    return pending
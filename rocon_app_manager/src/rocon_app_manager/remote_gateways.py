@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+#
+# License: BSD
+#   https://raw.github.com/robotics-in-concert/rocon_app_platform/master/rocon_app_manager/LICENSE
+#
+##############################################################################
+# Overview
+##############################################################################
+'''
+ A local cache of the remote gateways (name : ip) seen by our gateway, so
+ checks on invitations needn't call the gateway every time. It is
+ refreshed periodically in the background and on a miss (e.g. a concert
+ that has only just appeared), though not more often than a minimum
+ interval so floods of invites can't turn into floods of service calls.
+'''
+##############################################################################
+# Imports
+##############################################################################
+
+import time
+import threading
+import rospy
+
+##############################################################################
+# Class
+##############################################################################
+
+
+class RemoteGatewayCache(object):
+    __slots__ = ['_fetch', '_min_refresh_interval', '_gateways', '_last_refresh', '_lock', '_timer']
+
+    def __init__(self, fetch, min_refresh_interval=1.0):
+        '''
+          @param fetch : returns the remote gateways' info (gateway_msgs.RemoteGateway), e.g. via the remote_gateway_info service
+          @type method
+          @param min_refresh_interval : minimum time (s) between refreshes triggered by misses
+          @type float
+        '''
+        self._fetch = fetch
+        self._min_refresh_interval = min_refresh_interval
+        self._gateways = {}  # remote gateway name : ip
+        self._last_refresh = None
+        self._lock = threading.Lock()  # serialises refreshes
+        self._timer = None
+
+    def start(self, period):
+        '''
+          Refresh in the background.
+
+          @param period : time (s) between refreshes
+          @type float
+        '''
+        self._timer = rospy.Timer(rospy.Duration(period), self._refresh_callback)
+
+    def shutdown(self):
+        if self._timer is not None:
+            self._timer.shutdown()
+            self._timer = None
+
+    def invalidate(self):
+        '''
+          Drop everything, e.g. when our own gateway changes. The next lookup refreshes.
+        '''
+        with self._lock:
+            self._gateways = {}
+            self._last_refresh = None
+
+    def lookup(self, name):
+        '''
+          @param name : remote gateway name
+          @type str
+          @return the remote gateway's ip, or None if our gateway doesn't know of it
+          @rtype str
+        '''
+        ip = self._gateways.get(name)
+        if ip is None and (self._last_refresh is None or time.time() - self._last_refresh > self._min_refresh_interval):
+            self.refresh()
+            ip = self._gateways.get(name)
+        return ip
+
+    def refresh(self):
+        '''
+          Replace the cache with the latest remote gateway info. On failure the old
+          entries are kept.
+
+          @return true if the refresh succeeded
+          @rtype bool
+        '''
+        with self._lock:
+            try:
+                gateways = dict((gateway.name, gateway.ip) for gateway in self._fetch())
+            except (rospy.ServiceException, rospy.ROSInterruptException) as e:
+                rospy.logdebug("App Manager : failed to refresh remote gateway info [%s]" % str(e))
+                return False
+            finally:
+                self._last_refresh = time.time()
+            if gateways != self._gateways:
+                rospy.logdebug("App Manager : remote gateways updated %s" % sorted(gateways.keys()))
+                self._gateways = gateways
+            return True
+
+    def _refresh_callback(self, unused_event):
+        self.refresh()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+#
+# License: BSD
+#   https://raw.github.com/robotics-in-concert/rocon_app_platform/master/rocon_app_manager/LICENSE
+#
+##############################################################################
+# Imports
+##############################################################################
+
+import threading
+import time
+from .exceptions import AdmissionException
+
+##############################################################################
+# Class
+##############################################################################
+
+
+class AdmissionScheduler(object):
+    '''
+      Admits requests to start rapps, enforcing both the per-rapp share
+      configured in the rapp lists (-1 for no limit) and an overall limit on
+      the number of concurrently running rapp instances.
+
+      Requests over a limit are rejected immediately, or if a queue timeout
+      is configured, wait (first come, first served) for a slot to free up.
+    '''
+    __slots__ = ['max_running', 'queue_timeout', '_running', '_queue', '_condition']
+
+    def __init__(self, max_running=1, queue_timeout=0.0):
+        '''
+          @param max_running : limit on the total number of running rapp instances (-1 for no limit)
+          @type int
+          @param queue_timeout : how long (seconds) a request may wait for a slot, zero to reject immediately.
+          @type float
+        '''
+        self.max_running = max_running
+        self.queue_timeout = queue_timeout
+        self._running = {}  # rapp name : number of admitted instances
+        self._queue = []  # (ticket, name, share) of requests waiting for a slot
+        self._condition = threading.Condition()
+
+    def _has_slot(self, name, share):
+        total = sum(self._running.values())
+        if self.max_running >= 0 and total >= self.max_running:
+            return False
+        if share >= 0 and self._running.get(name, 0) >= max(share, 1):
+            return False
+        return True
+
+    def _explain(self, name, share):
+        if share >= 0 and self._running.get(name, 0) >= max(share, 1):
+            return "rapp is already running at its share limit [%s][%s]" % (name, share)
+        return "the maximum number of rapps are already running [%s]" % self.max_running
+
+    def admit(self, name, share):
+        '''
+          Admit a rapp for starting. Every successful admission must be
+          balanced by a call to release().
+
+          @param name : the rapp name
+          @type str
+          @param share : how many instances of this rapp may run concurrently (-1 for no limit)
+          @type int
+
+          @raise AdmissionException : if the rapp could not be admitted (in time).
+        '''
+        with self._condition:
+            if not self._queue and self._has_slot(name, share):
+                self._running[name] = self._running.get(name, 0) + 1
+                return
+            if self.queue_timeout <= 0:
+                raise AdmissionException(self._explain(name, share))
+            request = (object(), name, share)
+            self._queue.append(request)
+            deadline = time.time() + self.queue_timeout
+            try:
+                while True:
+                    # requests that were queued earlier get first dibs on a free slot
+                    earlier = self._queue[:self._queue.index(request)]
+                    if self._has_slot(name, share) and not any(self._has_slot(n, s) for (unused_t, n, s) in earlier):
+                        self._running[name] = self._running.get(name, 0) + 1
+                        return
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        raise AdmissionException("timed out waiting to start, " + self._explain(name, share))
+                    self._condition.wait(remaining)
+            finally:
+                self._queue.remove(request)
+                self._condition.notify_all()
+
+    def release(self, name):
+        '''
+          Release a slot previously granted by admit().
+
+          @param name : the rapp name
+          @type str
+        '''
+        with self._condition:
+            count = self._running.get(name, 0) - 1
+            if count > 0:
+                self._running[name] = count
+            else:
+                self._running.pop(name, None)
+            self._condition.notify_all()
+
+    def running(self, name=None):
+        '''
+          @param name : only count instances of this rapp (all rapps if None)
+          @type str
+          @return the number of admitted rapp instances
+          @rtype int
+        '''
+        with self._condition:
+            if name is None:
+                return sum(self._running.values())
+            return self._running.get(name, 0)
@@ -7,16 +7,160 @@
 # Imports
 ##############################################################################
 
+import os
+import errno
+import hashlib
+import threading
+from cStringIO import StringIO
 import rospy
+import rospkg
 import roslib.names
+import rocon_utilities
 import rocon_std_msgs.msg as rocon_std_msgs
+import gateway_msgs.msg as gateway_msgs
 from .exceptions import NotFoundException, InvalidPlatformTupleException
 
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
 ##############################################################################
 # Classes
 ##############################################################################
 
 
+class IconCache(object):
+    '''
+      Content addressed store for icon messages, so icon files aren't re-read
+      from disk every time an app message is built. Icons with identical
+      content (e.g. a default icon shared across several rapps) are stored
+      only once and can be fetched by their digest, optionally scaled down
+      to a thumbnail. Thumbnails are cached on disk.
+
+      If digests_only is set, icon_to_msg() returns references in place of
+      the icons: an empty icon whose format is 'sha1:<digest>'.
+    '''
+    __slots__ = ['digests_only', 'thumbnail_directory', '_icons', '_icons_by_digest', '_references', '_thumbnails', '_lock']
+
+    reference_prefix = 'sha1:'
+
+    def __init__(self):
+        self.digests_only = False
+        self.thumbnail_directory = os.path.join(rospkg.get_ros_home(), 'rocon', 'app_manager', 'icons')
+        self._icons = {}  # filename : (mtime, size, digest)
+        self._icons_by_digest = {}  # sha1 : rocon_std_msgs.Icon
+        self._references = {}  # sha1 : rocon_std_msgs.Icon referring to the icon
+        self._thumbnails = {}  # (sha1, size) : rocon_std_msgs.Icon
+        self._lock = threading.Lock()
+
+    def icon_to_msg(self, filename):
+        '''
+          Drop in replacement for rocon_utilities.icon_to_msg. The returned
+          message is shared, so it must not be modified.
+
+          @param filename : full path to the icon (can be None)
+          @type str
+          @return the icon message (or a reference to it if digests_only is set)
+          @rtype rocon_std_msgs.Icon
+        '''
+        digest = self.digest(filename)
+        with self._lock:
+            if self.digests_only:
+                return self._references[digest]
+            return self._icons_by_digest[digest]
+
+    def digest(self, filename):
+        '''
+          @param filename : full path to the icon (can be None)
+          @type str
+          @return the digest of the icon's content, for fetching it with get()
+          @rtype str
+        '''
+        try:
+            s = os.stat(filename) if filename else None
+        except OSError:
+            s = None
+        stamp = (s.st_mtime, s.st_size) if s else (None, None)
+        with self._lock:
+            cached = self._icons.get(filename)
+            if cached is not None and cached[:2] == stamp:
+                return cached[2]
+            icon = rocon_utilities.icon_to_msg(filename)
+            digest = hashlib.sha1(icon.format + ':' + str(icon.data)).hexdigest()
+            if digest not in self._icons_by_digest:
+                self._icons_by_digest[digest] = icon
+                # no point referring to an empty icon
+                self._references[digest] = rocon_std_msgs.Icon(format=IconCache.reference_prefix + digest) if icon.data else icon
+            self._icons[filename] = (stamp[0], stamp[1], digest)
+            return digest
+
+    def get(self, digest, size=0):
+        '''
+          Fetch an icon by digest. Icons never change for a given digest, so
+          clients can cache them indefinitely.
+
+          @param digest : the icon digest, with or without the 'sha1:' prefix of an icon reference
+          @type str
+          @param size : if non-zero, scale the icon down to fit a size x size thumbnail (needs PIL)
+          @type int
+          @return the icon message, shared so it must not be modified
+          @rtype rocon_std_msgs.Icon
+
+          @raise NotFoundException : if no icon with that digest has been loaded
+        '''
+        if digest.startswith(IconCache.reference_prefix):
+            digest = digest[len(IconCache.reference_prefix):]
+        with self._lock:
+            icon = self._icons_by_digest.get(digest)
+            if icon is None:
+                raise NotFoundException("no icon with digest [%s]" % digest)
+            if size <= 0 or not icon.data:
+                return icon
+            thumbnail = self._thumbnails.get((digest, size))
+        if thumbnail is None:
+            thumbnail = self._load_thumbnail(digest, icon, size)
+            with self._lock:
+                thumbnail = self._thumbnails.setdefault((digest, size), thumbnail)
+        return thumbnail
+
+    def _load_thumbnail(self, digest, icon, size):
+        if Image is None:
+            rospy.logdebug("App Manager : PIL not available, serving the full sized icon [%s]" % digest)
+            return icon
+        filename = os.path.join(self.thumbnail_directory, '%s_%s.png' % (digest, size))
+        try:
+            with open(filename, 'rb') as f:
+                return rocon_std_msgs.Icon(format='png', data=f.read())
+        except IOError:
+            pass
+        try:
+            image = Image.open(StringIO(str(icon.data)))
+            if max(image.size) <= size:
+                return icon
+            image.thumbnail((size, size), Image.ANTIALIAS)
+            buff = StringIO()
+            image.save(buff, 'PNG')
+        except Exception as e:  # PIL raises all sorts for unsupported or corrupt images
+            rospy.logwarn("App Manager : could not make a thumbnail, serving the full sized icon [%s][%s]" % (digest, str(e)))
+            return icon
+        thumbnail = rocon_std_msgs.Icon(format='png', data=buff.getvalue())
+        try:
+            try:
+                os.makedirs(self.thumbnail_directory)
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+            with open(filename + '.tmp', 'wb') as f:
+                f.write(thumbnail.data)
+            os.rename(filename + '.tmp', filename)
+        except (IOError, OSError) as e:
+            rospy.logwarn("App Manager : could not cache thumbnail [%s][%s]" % (filename, str(e)))
+        return thumbnail
+
+icon_cache = IconCache()
+
+
 class PlatformTuple(object):
     __slots__ = [
             'os',
@@ -41,6 +185,101 @@ class PlatformTuple(object):
         self.platform = platform_tuple_list[3]
 
 
+class PlatformIndex(object):
+    '''
+      Rapp names bucketed by the (os, system, platform) of their platform
+      tuples, so finding the rapps compatible with a platform is a handful of
+      bucket lookups rather than a check of every rapp.
+    '''
+    __slots__ = ['_buckets', '_keys']
+
+    def __init__(self):
+        self._buckets = {}  # (os, system, platform) : set of rapp names
+        self._keys = {}  # rapp name : (os, system, platform)
+
+    def add(self, name, platform_tuple):
+        '''
+          @param name : the rapp name
+          @type str
+          @param platform_tuple : the rapp's os.version.system.platform
+          @type str
+          @return false if the platform tuple was invalid (the rapp isn't indexed)
+          @rtype bool
+        '''
+        self.remove(name)
+        try:
+            (os, unused_version, system, platform) = parse_platform_tuple(platform_tuple)
+        except InvalidPlatformTupleException as e:
+            rospy.logwarn("App Manager : invalid platform tuple [%s][%s]" % (name, str(e)))
+            return False
+        key = (os, system, platform)
+        self._buckets.setdefault(key, set()).add(name)
+        self._keys[name] = key
+        return True
+
+    def remove(self, name):
+        key = self._keys.pop(name, None)
+        if key is not None:
+            bucket = self._buckets[key]
+            bucket.discard(name)
+            if not bucket:
+                del self._buckets[key]
+
+    def compatible(self, platform_tuple):
+        '''
+          Find the rapps compatible with a platform (see platform_compatible).
+
+          @param platform_tuple : os.version.system.platform
+          @type str
+          @return names of the compatible rapps
+          @rtype set of str
+
+          @raise InvalidPlatformTupleException : if the platform tuple is invalid
+        '''
+        (os, unused_version, system, platform) = parse_platform_tuple(platform_tuple)
+        os_any = rocon_std_msgs.PlatformInfo.OS_ANY
+        platform_any = rocon_std_msgs.PlatformInfo.SYSTEM_ANY
+        if os != os_any and platform != platform_any:
+            keys = [(o, system, p) for o in set([os, os_any]) for p in set([platform, platform_any])]
+        else:  # wildcard queries need a scan, but only of the buckets
+            keys = [key for key in self._buckets.keys()
+                    if key[1] == system and
+                    (os == os_any or key[0] in [os, os_any]) and
+                    (platform == platform_any or key[2] in [platform, platform_any])]
+        names = set()
+        for key in keys:
+            names.update(self._buckets.get(key, []))
+        return names
+
+##############################################################################
+# Methods
+##############################################################################
+
+_platform_tuples = {}  # platform tuple string : parsed (os, version, system, platform)
+
+
+def parse_platform_tuple(platform_tuple):
+    '''
+      Parse a platform tuple string into an interned, hashable tuple. Results
+      are cached, there are only ever a handful of distinct platform tuples.
+
+      @param platform_tuple : os.version.system.platform
+      @type string
+      @return (os, version, system, platform)
+      @rtype (str, str, str, str)
+
+      @raise InvalidPlatformTupleException : if it doesn't have four elements
+    '''
+    try:
+        return _platform_tuples[platform_tuple]
+    except KeyError:
+        pass
+    p = PlatformTuple(platform_tuple)
+    parsed = tuple(intern(e) if isinstance(e, str) else e for e in [p.os, p.version, p.system, p.platform])
+    _platform_tuples[platform_tuple] = parsed
+    return parsed
+
+
 def platform_tuple(os, version, system, platform):
     '''
       Return the platform tuple string identified by the four strings.
@@ -62,20 +301,35 @@ def platform_compatible(first_platform_tuple, second_platform_tuple):
       @rtype bool
     '''
     try:
-        platform_one = PlatformTuple(first_platform_tuple)
-        platform_two = PlatformTuple(second_platform_tuple)
+        (os_one, unused_version_one, system_one, platform_one) = parse_platform_tuple(first_platform_tuple)
+        (os_two, unused_version_two, system_two, platform_two) = parse_platform_tuple(second_platform_tuple)
     except InvalidPlatformTupleException as e:
         rospy.logwarn("App Manager : invalid platform tuple [%s]" % str(e))
         return False
-    if platform_one.os != rocon_std_msgs.PlatformInfo.OS_ANY and \
-       platform_two.os != rocon_std_msgs.PlatformInfo.OS_ANY and \
-       platform_one.os != platform_two.os:
+    if os_one != rocon_std_msgs.PlatformInfo.OS_ANY and \
+       os_two != rocon_std_msgs.PlatformInfo.OS_ANY and \
+       os_one != os_two:
         return False
     # Should check version here as well.
-    if platform_one.system != platform_two.system:
+    if system_one != system_two:
         return False
-    if platform_one.platform != rocon_std_msgs.PlatformInfo.SYSTEM_ANY and \
-       platform_two.platform != rocon_std_msgs.PlatformInfo.SYSTEM_ANY and \
-       platform_one.platform != platform_two.platform:
+    if platform_one != rocon_std_msgs.PlatformInfo.SYSTEM_ANY and \
+       platform_two != rocon_std_msgs.PlatformInfo.SYSTEM_ANY and \
+       platform_one != platform_two:
         return False
     return True
+
+
+def connections_by_type(subscribers, publishers, services, action_clients, action_servers):
+    '''
+      Bundle up a rapp's connection names (as returned by the rapp start/stop
+      methods) keyed by their gateway connection type.
+
+      @return the connection names keyed by connection type
+      @rtype { gateway_msgs.ConnectionType : [str] }
+    '''
+    return {gateway_msgs.ConnectionType.SUBSCRIBER: subscribers,
+            gateway_msgs.ConnectionType.PUBLISHER: publishers,
+            gateway_msgs.ConnectionType.SERVICE: services,
+            gateway_msgs.ConnectionType.ACTION_CLIENT: action_clients,
+            gateway_msgs.ConnectionType.ACTION_SERVER: action_servers}
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+#
+# License: BSD
+#   https://raw.github.com/robotics-in-concert/rocon_app_platform/master/rocon_app_manager/LICENSE
+#
+##############################################################################
+# Imports
+##############################################################################
+
+import unittest
+from cStringIO import StringIO
+import rocon_app_manager_msgs.msg as rapp_manager_msgs
+import rocon_app_manager_msgs.srv as rapp_manager_srvs
+import rocon_std_msgs.msg as rocon_std_msgs
+from rocon_app_manager.app_list import serialize_msg, SerializedAppList, SerializedGetAppListResponse
+
+##############################################################################
+# Tests
+##############################################################################
+
+
+def _app(name, status='Ready'):
+    return rapp_manager_msgs.App(name=name,
+                                 display_name=name.split('/')[-1],
+                                 description='a test app',
+                                 platform='linux.*.ros.*',
+                                 status=status,
+                                 icon=rocon_std_msgs.Icon(format='png', data='\x89PNG'))
+
+
+def _deserialize(msg_class, msg):
+    buff = StringIO()
+    msg.serialize(buff)
+    deserialized = msg_class()
+    deserialized.deserialize(buff.getvalue())
+    return deserialized
+
+
+class TestSerializedAppList(unittest.TestCase):
+    '''
+      The pre-serialized messages must deserialize as the stock messages they stand in for.
+    '''
+
+    def setUp(self):
+        self.available_apps = [_app('rocon_apps/chirp'), _app('rocon_apps/talker', 'Running')]
+        self.running_apps = [_app('rocon_apps/talker', 'Running')]
+
+    def _pairs(self, apps):
+        return [(app, serialize_msg(app)) for app in apps]
+
+    def test_app_list(self):
+        msg = SerializedAppList(self._pairs(self.available_apps), self._pairs(self.running_apps))
+        self.assertEqual(msg.available_apps, self.available_apps)
+        expected = rapp_manager_msgs.AppList(available_apps=self.available_apps, running_apps=self.running_apps)
+        self.assertEqual(_deserialize(rapp_manager_msgs.AppList, msg), expected)
+
+    def test_get_app_list_response(self):
+        msg = SerializedGetAppListResponse(self._pairs(self.available_apps), self._pairs(self.running_apps))
+        expected = rapp_manager_srvs.GetAppListResponse(available_apps=self.available_apps, running_apps=self.running_apps)
+        self.assertEqual(_deserialize(rapp_manager_srvs.GetAppListResponse, msg), expected)
+
+    def test_empty(self):
+        msg = SerializedAppList([], [])
+        self.assertEqual(_deserialize(rapp_manager_msgs.AppList, msg), rapp_manager_msgs.AppList())
+
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun('rocon_app_manager', 'test_app_list', TestSerializedAppList)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+#
+# License: BSD
+#   https://raw.github.com/robotics-in-concert/rocon_app_platform/master/rocon_app_manager/LICENSE
+#
+##############################################################################
+# Imports
+##############################################################################
+
+import os
+import shutil
+import logging
+import tempfile
+import unittest
+import rosgraph.roslogging
+from rocon_app_manager.launch_config import LaunchConfigCache
+
+##############################################################################
+# Tests
+##############################################################################
+
+LAUNCH_FILE = '''<launch>
+  <param name="rate" value="10"/>
+  <node pkg="rospy_tutorials" type="talker" name="talker"/>
+</launch>
+'''
+
+
+class TestLaunchConfigCache(unittest.TestCase):
+    '''
+      Copies of the parsed configurations are made for every rapp start, with
+      logging configured as it is in the app manager (rospy's log file on the
+      root logger), whose handlers can't be deep copied.
+    '''
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        env = dict(os.environ)
+        env['ROS_LOG_DIR'] = self.directory
+        rosgraph.roslogging.configure_logging('test_launch_config', env=env)
+        # in case the logging configuration can't be found, this is what rospy puts on the root logger
+        self.handler = logging.FileHandler(os.path.join(self.directory, 'root.log'))
+        logging.getLogger().addHandler(self.handler)
+        self.launch_file = os.path.join(self.directory, 'rapp.launch')
+        with open(self.launch_file, 'w') as f:
+            f.write(LAUNCH_FILE)
+        self.launch_text = '<launch><group ns="rapp"><include file="%s"/></group></launch>' % self.launch_file
+
+    def tearDown(self):
+        logging.getLogger().removeHandler(self.handler)
+        self.handler.close()
+        shutil.rmtree(self.directory)
+
+    def test_get(self):
+        cache = LaunchConfigCache(self.launch_file)
+        first = cache.get(self.launch_text)
+        second = cache.get(self.launch_text, force_screen=True)
+        self.assertEqual([node.name for node in first.nodes], ['talker'])
+        self.assertEqual(first.nodes[0].namespace, '/rapp/')
+        self.assertIn('/rapp/rate', first.params)
+        self.assertIsNot(first.nodes[0], second.nodes[0])
+        self.assertIs(first.logger, second.logger)
+        self.assertNotEqual(first.nodes[0].output, 'screen')
+        self.assertEqual(second.nodes[0].output, 'screen')
+
+    def test_prepare(self):
+        cache = LaunchConfigCache(self.launch_file)
+        cache.prepare(self.launch_text)
+        config = cache.get(self.launch_text)
+        self.assertEqual([node.name for node in config.nodes], ['talker'])
+        config.nodes[0].name = 'listener'
+        self.assertEqual([node.name for node in cache.get(self.launch_text).nodes], ['talker'])
+
+    def test_remaps(self):
+        cache = LaunchConfigCache(self.launch_file)
+        remapped = cache.get(self.launch_text, remap_args=[('chatter', '/rapp/chatter')])
+        plain = cache.get(self.launch_text)
+        self.assertIn(('chatter', '/rapp/chatter'), [tuple(remap) for remap in remapped.nodes[0].remap_args])
+        self.assertEqual(plain.nodes[0].remap_args, [])
+
+    def test_templates_bounded(self):
+        cache = LaunchConfigCache(self.launch_file)
+        for namespace in range(cache.max_templates + 2):
+            launch_text = '<launch><group ns="rapp%s"><include file="%s"/></group></launch>' % (namespace, self.launch_file)
+            cache.prepare(launch_text)
+        self.assertEqual(len(cache._templates), cache.max_templates)
+        self.assertEqual(len(cache._spares), cache.max_templates)
+
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun('rocon_app_manager', 'test_launch_config', TestLaunchConfigCache)
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+#
+# License: BSD
+#   https://raw.github.com/robotics-in-concert/rocon_app_platform/master/rocon_app_manager/LICENSE
+#
+##############################################################################
+# Imports
+##############################################################################
+
+import unittest
+import rocon_std_msgs.msg as rocon_std_msgs
+from rocon_app_manager.rapp import RappInstance
+
+##############################################################################
+# Stand ins
+##############################################################################
+
+
+class FakeProcessMonitor(object):
+    '''
+      Launches nothing, just hands out process names.
+    '''
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.active = set()
+        self.count = 0
+
+    def launch(self, instance, config):
+        if self.fail:
+            raise RuntimeError("launch failed")
+        self.count += 1
+        names = ['%s_node_%s' % (instance.name, self.count)]
+        self.active.update(names)
+        return names, set()
+
+    def active_names(self):
+        return set(self.active)
+
+    def kill(self, names):
+        self.active.difference_update(names)
+
+    def get_process(self, name):
+        return None
+
+
+class FakeLaunchConfigs(object):
+    def get(self, launch_text, force_screen=False):
+        return None
+
+
+class FakeRapp(object):
+    '''
+      Just what a rapp instance uses of its rapp.
+    '''
+    def __init__(self):
+        self.data = {'name': 'rocon_apps/talker', 'launch': '/tmp/talker.launch', 'launch_args': [], 'status': 'Ready'}
+        self.instances = []
+        self.launch_configs = FakeLaunchConfigs()
+
+    def resolve_connections(self, application_namespace, remappings=[]):
+        return [], dict((connection_type, []) for connection_type in ['publishers', 'subscribers', 'services', 'action_clients', 'action_servers'])
+
+##############################################################################
+# Tests
+##############################################################################
+
+
+class TestRappInstance(unittest.TestCase):
+
+    def setUp(self):
+        self.rapp = FakeRapp()
+        self.process_monitor = FakeProcessMonitor()
+
+    def _instance(self, name):
+        return RappInstance(self.rapp, name, 'app/' + name, process_monitor=self.process_monitor)
+
+    def _start(self, instance):
+        return instance.start('gateway', rocon_std_msgs.PlatformInfo())[0]
+
+    def test_start_stop(self):
+        instance = self._instance('talker')
+        self.assertFalse(instance.is_running())
+        self.assertTrue(self._start(instance))
+        self.assertTrue(instance.is_running())
+        self.assertEqual(self.rapp.instances, [instance])
+        self.assertEqual(self.rapp.data['status'], 'Running')
+        self.assertTrue(instance.stop()[0])
+        self.assertFalse(instance.is_running())
+        self.assertEqual(self.rapp.instances, [])
+        self.assertEqual(self.rapp.data['status'], 'Ready')
+        self.assertEqual(self.process_monitor.active, set())
+
+    def test_status_shared_by_instances(self):
+        first = self._instance('talker')
+        second = self._instance('talker_2')
+        self.assertTrue(self._start(first))
+        self.assertTrue(self._start(second))
+        self.assertTrue(first.stop()[0])
+        self.assertEqual(self.rapp.instances, [second])
+        self.assertEqual(self.rapp.data['status'], 'Running')
+        self.assertTrue(second.stop()[0])
+        self.assertEqual(self.rapp.data['status'], 'Ready')
+
+    def test_failed_start_alongside_running_instance(self):
+        running = self._instance('talker')
+        self.assertTrue(self._start(running))
+        self.process_monitor.fail = True
+        failed = self._instance('talker_2')
+        self.assertFalse(self._start(failed))
+        self.assertEqual(self.rapp.instances, [running])
+        self.assertEqual(self.rapp.data['status'], 'Running')
+        self.assertTrue(running.stop()[0])
+        self.assertEqual(self.rapp.data['status'], 'Ready')
+
+    def test_failed_start(self):
+        self.process_monitor.fail = True
+        instance = self._instance('talker')
+        self.assertFalse(self._start(instance))
+        self.assertFalse(instance.is_running())
+        self.assertTrue(self.rapp.data['status'].startswith('Error'))
+
+    def test_stop_before_start(self):
+        instance = self._instance('talker')
+        self.assertTrue(instance.stop()[0])
+        self.assertFalse(self._start(instance))
+        self.assertEqual(self.process_monitor.active, set())
+        self.assertEqual(self.rapp.data['status'], 'Ready')
+
+    def test_process_exit(self):
+        exits = []
+        instance = RappInstance(self.rapp, 'talker', 'app/talker', exit_callback=exits.append, process_monitor=self.process_monitor)
+        self.assertTrue(self._start(instance))
+        (process_name,) = self.process_monitor.active
+        instance._process_died(process_name, 0)
+        self.assertFalse(instance.is_running())
+
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun('rocon_app_manager', 'test_rapp_instance', TestRappInstance)
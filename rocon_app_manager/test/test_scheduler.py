@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+#
+# License: BSD
+#   https://raw.github.com/robotics-in-concert/rocon_app_platform/master/rocon_app_manager/LICENSE
+#
+##############################################################################
+# Imports
+##############################################################################
+
+import time
+import threading
+import unittest
+from rocon_app_manager.scheduler import AdmissionScheduler
+from rocon_app_manager.exceptions import AdmissionException
+
+##############################################################################
+# Tests
+##############################################################################
+
+
+class TestAdmissionScheduler(unittest.TestCase):
+
+    def test_max_running(self):
+        scheduler = AdmissionScheduler(max_running=2)
+        scheduler.admit('a', -1)
+        scheduler.admit('b', -1)
+        self.assertRaises(AdmissionException, scheduler.admit, 'c', -1)
+        scheduler.release('a')
+        scheduler.admit('c', -1)
+        self.assertEqual(scheduler.running(), 2)
+
+    def test_unlimited(self):
+        scheduler = AdmissionScheduler(max_running=-1)
+        for unused_i in range(10):
+            scheduler.admit('a', -1)
+        self.assertEqual(scheduler.running('a'), 10)
+
+    def test_share(self):
+        scheduler = AdmissionScheduler(max_running=-1)
+        scheduler.admit('a', 2)
+        scheduler.admit('a', 2)
+        self.assertRaises(AdmissionException, scheduler.admit, 'a', 2)
+        scheduler.admit('b', 2)
+        self.assertEqual(scheduler.running('a'), 2)
+        self.assertEqual(scheduler.running(), 3)
+
+    def test_zero_share_is_one(self):
+        scheduler = AdmissionScheduler(max_running=-1)
+        scheduler.admit('a', 0)
+        self.assertRaises(AdmissionException, scheduler.admit, 'a', 0)
+
+    def test_release_unknown(self):
+        scheduler = AdmissionScheduler()
+        scheduler.release('a')
+        self.assertEqual(scheduler.running(), 0)
+
+    def test_queue_timeout(self):
+        scheduler = AdmissionScheduler(max_running=1, queue_timeout=0.1)
+        scheduler.admit('a', -1)
+        start = time.time()
+        self.assertRaises(AdmissionException, scheduler.admit, 'b', -1)
+        self.assertTrue(time.time() - start >= 0.1)
+
+    def test_queued_until_released(self):
+        scheduler = AdmissionScheduler(max_running=1, queue_timeout=5.0)
+        scheduler.admit('a', -1)
+        admitted = []
+        thread = threading.Thread(target=lambda: admitted.append(scheduler.admit('b', -1)))
+        thread.start()
+        time.sleep(0.1)
+        self.assertEqual(admitted, [])
+        scheduler.release('a')
+        thread.join(5.0)
+        self.assertEqual(len(admitted), 1)
+        self.assertEqual(scheduler.running('b'), 1)
+
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun('rocon_app_manager', 'test_scheduler', TestAdmissionScheduler)